@@ -0,0 +1,370 @@
+## Benchmarks for CarRacingObstacles (run from the repository root: python benchmark.py --output results.json)
+
+import argparse
+import json
+import multiprocessing as mp
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from car_racing_obstacles import CarRacingObstacles
+from car_racing_obstacles_psi import CarRacingObstaclesPsiKP
+from car_racing_obstacles_psi_eval import CarRacingObstaclesPsiKPEval
+
+# Step benchmark configurations: name -> (CarRacingObstacles options, render mode called after every step)
+STEP_MODES = {
+    "state_pixels_gl": ({"render_backend": "gl"}, None),
+    "state_pixels_numpy": ({"render_backend": "numpy"}, None),
+    "rays": ({"obs_type": "rays"}, None),
+    "none": ({"obs_type": "none"}, None),
+    "rgb_array": ({"obs_type": "none"}, "rgb_array"),
+}
+
+def _latency_stats(latencies):
+    """Returns the mean/p50/p95 (in ms) and the rate (per second) of a list of latencies (in seconds)."""
+    latencies = np.asarray(latencies, dtype=np.float64)
+    return {
+        "mean_ms": float(1000 * latencies.mean()),
+        "p50_ms": float(1000 * np.percentile(latencies, 50)),
+        "p95_ms": float(1000 * np.percentile(latencies, 95)),
+        "per_s": float(len(latencies) / latencies.sum()),
+    }
+
+def _random_actions(num_steps, seed):
+    rng = np.random.default_rng(seed)
+    return rng.uniform([-1, 0.3, 0], [1, 1, 0.1], size=(num_steps, 3)).astype(np.float32)
+
+def _time_steps(env, actions, seed, render_mode=None):
+    """Resets env with seed, and returns the latencies (in seconds) of step() (+ render(render_mode)) for actions."""
+    env.seed(seed)
+    env.reset()
+    latencies = []
+    for action in actions:
+        start = time.perf_counter()
+        _, _, done, _ = env.step(action)
+        if render_mode is not None:
+            env.render(render_mode)
+        latencies.append(time.perf_counter() - start)
+        if done:
+            env.reset()
+    return latencies
+
+def benchmark_render_backends(num_steps=500, seed=0, STATE_W=96, STATE_H=96):
+    """
+    Compares the "gl" and "numpy" state_pixels render backends on the same track and action sequence.
+
+    Prints and returns the mean step() time of each backend, and the per-pixel difference between them.
+
+    Args:
+        num_steps (int): number of steps to run with each backend
+        seed (int): seed used for the track and the actions
+    """
+    rng = np.random.default_rng(seed)
+    actions = rng.uniform([-1, 0, 0], [1, 1, 0.2], size=(num_steps, 3)).astype(np.float32)
+    observations = {}
+    step_times = {}
+    for backend in ["gl", "numpy"]:
+        env = CarRacingObstacles(STATE_W=STATE_W, STATE_H=STATE_H, verbose=0, render_backend=backend)
+        env.seed(seed)
+        env.reset()
+        frames = []
+        start = time.perf_counter()
+        for action in actions:
+            obs, _, done, _ = env.step(action)
+            frames.append(obs.copy())
+            if done:
+                break
+        step_times[backend] = (time.perf_counter() - start) / len(frames)
+        observations[backend] = np.stack(frames)
+        env.close()
+
+    n = min(len(observations["gl"]), len(observations["numpy"]))
+    diff = np.abs(observations["gl"][:n].astype(np.int16) - observations["numpy"][:n].astype(np.int16))
+    results = {
+        "gl_step_ms": 1000 * step_times["gl"],
+        "numpy_step_ms": 1000 * step_times["numpy"],
+        "mean_abs_pixel_diff": float(diff.mean()),
+        "frac_pixels_diff_gt_8": float((diff.max(axis=-1) > 8).mean()),
+    }
+    print(f"Render backends ({STATE_W}x{STATE_H}, {n} steps): {results}")
+    return results
+
+def benchmark_reset(num_resets=50, turn_rates=(0.31, 0.51, 0.71), obstacle_probs=(0.05, 0.13), seed=0):
+    """
+    Measures reset() latency (track generation, including retries, and Box2D body creation) and the
+    _create_track() retry rate, for every (TRACK_TURN_RATE, OBSTACLE_PROB) pair.
+
+    Uses the "numpy" render backend so that no GL rendering is included in the measurement
+    (the rasterizer still pre-rasterizes each track). Run it on two commits to compare them.
+
+    Args:
+        num_resets (int): number of resets per parameter pair
+        turn_rates (tuple): TRACK_TURN_RATE values to measure
+        obstacle_probs (tuple): OBSTACLE_PROB values to measure
+        seed (int): environment seed
+    """
+    results = {}
+    for turn_rate in turn_rates:
+        for obstacle_prob in obstacle_probs:
+            env = CarRacingObstacles(verbose=0, render_backend="numpy")
+            env.TRACK_TURN_RATE = turn_rate
+            env.OBSTACLE_PROB = obstacle_prob
+            env.seed(seed)
+            latencies = []
+            for _ in range(num_resets):
+                start = time.perf_counter()
+                env.reset()
+                latencies.append(time.perf_counter() - start)
+            env.close()
+            name = f"K={turn_rate},p={obstacle_prob}"
+            results[name] = dict(_latency_stats(latencies), retries_per_reset=env.num_track_retries / num_resets)
+            print(f"reset() latency ({name}): {results[name]}")
+    return results
+
+def _current_rss_kb():
+    """Current (not peak) resident set size of this process, in kB (from /proc/self/statm, on Linux)."""
+    with open("/proc/self/statm") as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * resource.getpagesize() // 1024
+
+def _body_pooling_run(pool_bodies, reuse_car, num_resets, seed):
+    env = CarRacingObstacles(verbose=0, render_backend="numpy", pool_bodies=pool_bodies, reuse_car=reuse_car)
+    env.seed(seed)
+    env.reset()     # (the first reset allocates what every configuration allocates)
+    rss_before = _current_rss_kb()
+    latencies = []
+    for _ in range(num_resets):
+        start = time.perf_counter()
+        env.reset()
+        latencies.append(time.perf_counter() - start)
+    rss_after = _current_rss_kb()
+    env.close()
+    latencies = 1000 * np.array(latencies)
+    return {
+        "mean_ms": float(latencies.mean()),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "rss_growth_kb": rss_after - rss_before,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+def benchmark_body_pooling(num_resets=10000, seed=0):
+    """
+    Compares reset() latency and memory with and without Box2D body pooling.
+
+    Each configuration runs in its own fresh process, which reports the growth of its current RSS over the
+    resets (after a first warm-up reset) and its peak RSS.
+
+    Args:
+        num_resets (int): number of resets per configuration
+        seed (int): environment seed
+    """
+    results = {}
+    for pool_bodies, reuse_car in [(False, False), (True, False), (True, True)]:
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+            name = f"pool_bodies={pool_bodies},reuse_car={reuse_car}"
+            results[name] = pool.submit(_body_pooling_run, pool_bodies, reuse_car, num_resets, seed).result()
+        print(f"reset() x{num_resets} ({name}): {results[name]}")
+    return results
+
+def benchmark_prefetch(num_episodes=30, steps_per_episode=100, seed=0):
+    """
+    Compares reset() latency and overall throughput (resets + short episodes) without track prefetching,
+    and with prefetching in a thread and in a helper process.
+
+    Args:
+        num_episodes (int): number of episodes per configuration
+        steps_per_episode (int): steps between two resets (time the prefetcher has to generate the next track)
+        seed (int): environment seed
+    """
+    actions = _random_actions(steps_per_episode, seed)
+    results = {}
+    for name, options in [("sync", {}), ("thread", {"prefetch": 2}),
+                          ("process", {"prefetch": 2, "prefetch_process": True})]:
+        env = CarRacingObstacles(verbose=0, obs_type="none", **options)
+        env.seed(seed)
+        reset_latencies = []
+        start = time.perf_counter()
+        for _ in range(num_episodes):
+            reset_start = time.perf_counter()
+            env.reset()
+            reset_latencies.append(time.perf_counter() - reset_start)
+            for action in actions:
+                if env.step(action)[2]:
+                    break
+        elapsed = time.perf_counter() - start
+        env.close()
+        results[name] = dict(_latency_stats(reset_latencies), episodes_per_s=num_episodes / elapsed)
+        print(f"reset() with prefetch={name}: {results[name]}")
+    return results
+
+def benchmark_step(num_steps=500, seed=0, STATE_W=96, STATE_H=96, modes=tuple(STEP_MODES)):
+    """
+    Measures step() latency and throughput for every observation/render mode of STEP_MODES.
+
+    Args:
+        num_steps (int): number of steps per mode
+        seed (int): seed used for the track and the actions
+        modes (tuple): names of the STEP_MODES to measure
+    """
+    actions = _random_actions(num_steps, seed)
+    results = {}
+    for mode in modes:
+        options, render_mode = STEP_MODES[mode]
+        env = CarRacingObstacles(STATE_W=STATE_W, STATE_H=STATE_H, verbose=0, **options)
+        results[mode] = _latency_stats(_time_steps(env, actions, seed, render_mode))
+        env.close()
+        print(f"step() ({mode}, {STATE_W}x{STATE_H}): {results[mode]}")
+    return results
+
+def benchmark_state_size(sizes=((64, 64), (96, 96), (128, 128)), num_steps=300, seed=0,
+                         modes=("state_pixels_gl", "state_pixels_numpy")):
+    """
+    Measures step() throughput for several observation sizes (STATE_W, STATE_H).
+    """
+    return {f"{w}x{h}": benchmark_step(num_steps, seed, w, h, modes) for w, h in sizes}
+
+def benchmark_psi(num_steps=300, seed=0, render_backend="numpy"):
+    """
+    Measures step() and reset() latency of the psi (with and without normalize_obs) and psi-eval subclasses.
+    """
+    actions = _random_actions(num_steps, seed)
+    configurations = {
+        "psi": lambda: CarRacingObstaclesPsiKP(verbose=0, render_backend=render_backend),
+        "psi_normalized": lambda: CarRacingObstaclesPsiKP(verbose=0, normalize_obs=True, render_backend=render_backend),
+        "psi_eval": lambda: CarRacingObstaclesPsiKPEval(verbose=0, render_backend=render_backend),
+    }
+    results = {}
+    for name, make_env in configurations.items():
+        env = make_env()
+        step_latencies = _time_steps(env, actions, seed)
+        reset_latencies = []
+        for _ in range(10):
+            start = time.perf_counter()
+            env.reset()
+            reset_latencies.append(time.perf_counter() - start)
+        env.close()
+        results[name] = {"step": _latency_stats(step_latencies), "reset": _latency_stats(reset_latencies)}
+        print(f"{name}: {results[name]}")
+    return results
+
+class _RandomPolicy:
+    """Seeded random policy with the predict() interface of stable_baselines3 models."""
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+
+    def predict(self, obs):
+        return self.rng.uniform([-1, 0.3, 0], [1, 1, 0.1]).astype(np.float32), None
+
+def benchmark_evaluation(num_episodes=3, seed=0, render_backend="numpy"):
+    """
+    Measures evaluate_best_model() end-to-end (random policy on CarRacingObstaclesPsiKPEval).
+    """
+    from utilities.utils import evaluate_best_model
+    env = CarRacingObstaclesPsiKPEval(verbose=0, render_backend=render_backend)
+    start = time.perf_counter()
+    evaluation = evaluate_best_model(_RandomPolicy(seed), env, num_episodes=num_episodes, seed=seed)
+    elapsed = time.perf_counter() - start
+    results = {
+        "total_s": elapsed,
+        "episode_mean_ms": 1000 * elapsed / num_episodes,
+        "steps_per_s": float(evaluation.timesteps.sum() / elapsed),
+    }
+    print(f"evaluate_best_model() x{num_episodes}: {results}")
+    return results
+
+# Benchmarks of the suite: name -> (full run, quick run)
+SUITE = {
+    "step": (lambda: benchmark_step(), lambda: benchmark_step(num_steps=100)),
+    "state_size": (lambda: benchmark_state_size(), lambda: benchmark_state_size(num_steps=50)),
+    "reset": (lambda: benchmark_reset(), lambda: benchmark_reset(num_resets=5)),
+    "prefetch": (lambda: benchmark_prefetch(), lambda: benchmark_prefetch(num_episodes=5)),
+    "psi": (lambda: benchmark_psi(), lambda: benchmark_psi(num_steps=50)),
+    "evaluation": (lambda: benchmark_evaluation(), lambda: benchmark_evaluation(num_episodes=1)),
+    "render_backends": (lambda: benchmark_render_backends(), lambda: benchmark_render_backends(num_steps=100)),
+    "body_pooling": (lambda: benchmark_body_pooling(num_resets=1000), lambda: benchmark_body_pooling(num_resets=50)),
+}
+
+def _metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+def run_suite(names=tuple(SUITE), quick=False):
+    """
+    Runs the benchmarks of SUITE. A benchmark which fails (e.g. the GL ones without a display) is recorded
+    with its error instead of stopping the suite.
+
+    Return:
+        dict with the run metadata (commit, versions, platform) and the results of every benchmark
+    """
+    results = {}
+    for name in names:
+        try:
+            results[name] = SUITE[name][1 if quick else 0]()
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+            print(f"Benchmark {name} failed: {results[name]['error']}")
+    return {"metadata": dict(_metadata(), quick=quick), "results": results}
+
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, prefix + key + "/"))
+        elif isinstance(value, (int, float)):
+            flat[prefix + key] = float(value)
+    return flat
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Compares two run_suite() outputs. Latencies ("_ms" metrics) are regressions when they grow, and
+    rates ("per_s" metrics) when they shrink, by more than threshold (relative).
+
+    Return:
+        list of (metric, baseline value, current value, relative change) regressions
+    """
+    old = _flatten(baseline["results"])
+    new = _flatten(current["results"])
+    regressions = []
+    for metric in sorted(old.keys() & new.keys()):
+        if old[metric] == 0:
+            continue
+        change = (new[metric] - old[metric]) / old[metric]
+        if (metric.endswith("_ms") and change > threshold) or (metric.endswith("per_s") and change < -threshold):
+            regressions.append((metric, old[metric], new[metric], change))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CarRacingObstacles benchmark suite")
+    parser.add_argument("--only", nargs="+", choices=list(SUITE), default=list(SUITE), help="benchmarks to run")
+    parser.add_argument("--quick", action="store_true", help="fewer steps/resets (smoke test)")
+    parser.add_argument("--output", help="write the results (JSON) to this file")
+    parser.add_argument("--compare", help="results (JSON) of a baseline run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change reported as a regression")
+    args = parser.parse_args()
+
+    suite_results = run_suite(args.only, quick=args.quick)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(suite_results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, suite_results, args.threshold)
+        for metric, old, new, change in regressions:
+            print(f"REGRESSION {metric}: {old:.4g} -> {new:.4g} ({100 * change:+.1f}%)")
+        print(f"{len(regressions)} regression(s) against {baseline['metadata'].get('commit')}")
+        sys.exit(1 if regressions else 0)
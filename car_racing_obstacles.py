@@ -32,6 +32,9 @@ Created by Oleg Klimov. Licensed on the same terms as the rest of OpenAI Gym.
 """
 import sys
 import math
+import ctypes
+import logging
+from time import perf_counter_ns
 import numpy as np
 
 np.random.seed(0)
@@ -43,15 +46,28 @@ from Box2D.b2 import contactListener
 
 import gym
 from gym import spaces
-from gym.envs.box2d.car_dynamics import Car
+from gym.envs.box2d.car_dynamics import Car, SIZE, WHEELPOS
 from gym.utils import seeding, EzPickle
 
-import pyglet
+try:
+    import pyglet
 
-pyglet.options["debug_gl"] = False
-from pyglet import gl
+    pyglet.options["debug_gl"] = False
+    from pyglet import gl
+except ImportError:
+    # No GL available (e.g. headless nodes): only the "numpy" render backend can produce state_pixels
+    pyglet = None
+    gl = None
 
 import utilities.utils as utils
+from utilities.prefetch import FixedPsi, TrackPrefetcher
+from utilities.profiling import PhaseProfiler
+from utilities.rasterizer import TrackRasterizer
+from utilities.resample import AreaDownsampler
+from utilities.sensors import RaySensor
+from utilities.track_cache import GEOMETRY_KEYS, rng_state_to_arrays, set_rng_state_from_arrays
+
+logger = logging.getLogger(__name__)
 
 VIDEO_W = 600
 VIDEO_H = 400
@@ -78,6 +94,21 @@ OBSTACLE_PENALTY = 50.0
 OBSTACLE_SPACING = 20   # minimum distance between obstacles (in tiles)
 OBSTACLE_COLOR = [240/255, 102/255, 102/255] # light red
 
+TILE_POOL_HIGH_WATER = 2.0  # pooled tile bodies kept, as a multiple of the current track's tiles (see pool_bodies)
+
+# Fields the info dict of step() can contain (see the info_keys argument of CarRacingObstacles), and how they are
+# computed. Only the requested fields are computed, so expensive ones cost nothing when they are not used.
+INFO_FIELDS = {
+    "num_obstacles": lambda env: env.num_obstacles,
+    "num_collisions": lambda env: env.num_collisions,
+    "background": lambda env: env.background_category(),
+    "wheels_on_grass": lambda env: len(env.car.wheels) - env.num_wheels_on_tiles,
+    "tile_visited_count": lambda env: env.tile_visited_count,
+    "nearest_obs_dist": lambda env: utils.get_nearest_obstacle_distance(env.car, env.obstacle_index),
+    "nearest_obs_ahead_dist": lambda env: utils.get_nearest_obstacle_ahead_distance(env.car, env.obstacle_index),
+}
+DEFAULT_INFO_KEYS = ("num_obstacles", "num_collisions", "background", "nearest_obs_dist")
+
 class FrictionDetector(contactListener):
     def __init__(self, env):
         contactListener.__init__(self)
@@ -89,55 +120,154 @@ class FrictionDetector(contactListener):
     def EndContact(self, contact):
         self._contact(contact, False)
 
-    def _contact(self, contact, begin):
+    def _find_tile(self, contact):
+        """
+        Returns the (tile id, other body) pair of a contact, or (None, None) if no tile is involved.
+        Tile bodies store their integer tile id (index into the env's tile arrays) in userData.
+        """
         tile = None
         obj = None
         u1 = contact.fixtureA.body.userData
         u2 = contact.fixtureB.body.userData
-        if u1 and "road_friction" in u1.__dict__:
+        if type(u1) is int:
             tile = u1
             obj = u2
-        if u2 and "road_friction" in u2.__dict__:
+        if type(u2) is int:
             tile = u2
             obj = u1
-        if not tile:
+        return tile, obj
+
+    def _count_wheel_contact(self, wheel, tile_body, is_obstacle, begin):
+        """
+        Adds (begin) or removes tile_body to/from the tiles of wheel, keeping its count of obstacle tiles.
+
+        Return:
+            (change in the number of wheels touching any tile, change in the number of wheels touching an
+            obstacle tile), each -1, 0 or 1
+        """
+        if begin:
+            on_tiles = 0 if wheel.tiles else 1
+            wheel.tiles.add(tile_body)
+            if is_obstacle:
+                wheel.num_obstacle_tiles += 1
+                return on_tiles, 1 if wheel.num_obstacle_tiles == 1 else 0
+            return on_tiles, 0
+        wheel.tiles.remove(tile_body)
+        on_tiles = 0 if wheel.tiles else -1
+        if is_obstacle:
+            wheel.num_obstacle_tiles -= 1
+            return on_tiles, -1 if wheel.num_obstacle_tiles == 0 else 0
+        return on_tiles, 0
+
+    def _recolor(self, tile, is_obstacle):
+        """
+        Turns visited road tiles into default road color,
+        but leaves obstacle tiles alone.
+        """
+        poly = self.env.tile_poly_index[tile]
+        color = self.env.poly_colors[poly]
+        if not is_obstacle and (color != ROAD_COLOR).any():
+            color[:] = ROAD_COLOR
+            # Only the recolored tiles are re-uploaded to the retained GL geometry
+            self.env.recolored_tiles.append(poly)
+
+    def _contact(self, contact, begin):
+        tile, obj = self._find_tile(contact)
+        if tile is None:
             return
+        env = self.env
 
-        # If the tile's friction is above a certain value,
-        # this indicates that the car ran into an obstacle.
-        is_obstacle = tile.road_friction > 2.0
+        # Obstacle tiles are the ones with a friction above a certain value
+        # (this indicates that the car ran into an obstacle).
+        is_obstacle = env.tile_is_obstacle[tile]
 
-        # Turns visited road tiles into default road color,
-        # but leaves obstacle tiles alone.
-        if not is_obstacle:
-            tile.color[0] = ROAD_COLOR[0]
-            tile.color[1] = ROAD_COLOR[1]
-            tile.color[2] = ROAD_COLOR[2]
+        self._recolor(tile, is_obstacle)
         if not obj or "tiles" not in obj.__dict__:
             return
+        # The wheels keep the tile bodies (Car.step() reads their road_friction), and the env the number of
+        # wheels on any tile/on obstacles (so that the surface under the car is known without scanning them)
+        on_tiles, on_obstacles = self._count_wheel_contact(obj, env.road[tile], is_obstacle, begin)
+        env.num_wheels_on_tiles += on_tiles
+        env.num_wheels_on_obstacles += on_obstacles
         if begin:
-            obj.tiles.add(tile)
+            env.tile_contact_count[tile] += 1
 
             # We should always incur a penalty for obstacles,
             # even if we have visited them before,
             # as long as we aren't currently in contact with them.
-            if is_obstacle and not tile.currently_in_contact:
-                self.env.reward -= tile.road_friction
-                self.env.num_collisions += 1
+            if is_obstacle and not env.tile_in_contact[tile]:
+                env.reward -= env.tile_friction[tile]
+                env.num_collisions += 1
 
             # For all tiles we record whether we have visited them before.
             # But only incur reward for the first time we visit the road (non-obstacle) tiles.
-            if not tile.road_visited:
-                tile.road_visited = True
+            if not env.tile_visited[tile]:
+                env.tile_visited[tile] = True
                 if not is_obstacle:
-                    self.env.reward += 1000.0 / len(self.env.track)
-                    self.env.tile_visited_count += 1
+                    env.reward += 1000.0 / len(env.track)
+                    env.tile_visited_count += 1
 
-            # Set currently_in_contact to true since we are currently in contact with the tile.
-            tile.currently_in_contact = True
+            # Set tile_in_contact to true since we are currently in contact with the tile.
+            env.tile_in_contact[tile] = True
         else:
-            obj.tiles.remove(tile)
-            tile.currently_in_contact = False
+            env.tile_contact_count[tile] -= 1
+            env.tile_in_contact[tile] = False
+
+
+class LazyObservation:
+    """
+    Observation returned by CarRacingObstacles.step() when lazy_obs is set. The state_pixels image is only
+    rendered when it is first read (with get() or np.asarray()), and only until the next step()/reset():
+    reading it afterwards raises a RuntimeError, since the state it showed no longer exists.
+    """
+    def __init__(self, env):
+        self.env = env
+        self.step_index = env.step_index
+        self.value = None
+
+    def get(self):
+        if self.value is None:
+            if self.env.step_index != self.step_index:
+                raise RuntimeError("Lazy observation read after the environment was stepped again")
+            self.value = self.env.get_observation()
+        return self.value
+
+    def __array__(self, dtype=None):
+        arr = self.get()
+        return arr if dtype is None else arr.astype(dtype)
+
+    @property
+    def shape(self):
+        return self.env.observation_space.shape
+
+    @property
+    def dtype(self):
+        return self.env.observation_space.dtype
+
+
+class _GeomCollector:
+    """
+    Stand-in for the gym rendering.Viewer Car.draw() draws into: collects the geoms it creates, so that a
+    car can be drawn without a window (see CarRacingObstacles._draw_state_gl()).
+    """
+    def __init__(self):
+        self.onetime_geoms = []
+
+    def draw_polygon(self, v, filled=True, **attrs):
+        from gym.envs.classic_control import rendering
+
+        geom = rendering.make_polygon(v=v, filled=filled)
+        rendering._add_attrs(geom, attrs)
+        self.onetime_geoms.append(geom)
+        return geom
+
+    def draw_polyline(self, v, **attrs):
+        from gym.envs.classic_control import rendering
+
+        geom = rendering.make_polyline(v=v)
+        rendering._add_attrs(geom, attrs)
+        self.onetime_geoms.append(geom)
+        return geom
 
 
 class CarRacingObstacles(gym.Env, EzPickle):
@@ -146,7 +276,51 @@ class CarRacingObstacles(gym.Env, EzPickle):
         "video.frames_per_second": FPS,
     }
 
-    def __init__(self, STATE_W=96, STATE_H=96, verbose=1):
+    def __init__(self, STATE_W=96, STATE_H=96, verbose=1, render_backend="gl", track_cache=None,
+                 pool_bodies=True, reuse_car=False, frame_skip=1, obs_type="pixels", lazy_obs=False,
+                 ray_sensor=None, profile=False, profile_info=False, telemetry=None, prefetch=0,
+                 prefetch_process=False, resolutions=None, info_keys=DEFAULT_INFO_KEYS):
+        """
+        Args:
+            STATE_W, STATE_H (int): size of the "state_pixels" observations
+            verbose (int): 1 to log track generation messages (all messages go to the "car_racing_obstacles"
+                logger, at INFO/DEBUG level, so they are only shown once logging is configured to show them)
+            render_backend (str): "gl" renders state_pixels with pyglet/OpenGL, "numpy" uses the
+                headless TrackRasterizer (see utilities/rasterizer.py). "human" and "rgb_array" always use GL.
+            track_cache (utilities.track_cache.TrackCache): optional cache of generated tracks. On a hit,
+                reset() only creates the Box2D bodies of the cached track.
+            pool_bodies (bool): keep the tile bodies across reset() calls (deactivated), and reassign
+                their polygon vertices instead of destroying and re-creating them. The pool grows with the
+                longest track, and shrinks back to TILE_POOL_HIGH_WATER times the current track's tiles.
+            reuse_car (bool): re-position the car on reset() instead of re-creating it. Box2D does not let
+                us clear the joints' warm-starting impulses, so the first steps can differ very slightly
+                from a freshly built car.
+            frame_skip (int): number of simulation frames per step() (action repeat). Rewards are summed over
+                the frames; the observation and info are only computed for the last one.
+            obs_type (str): "pixels" for state_pixels observations, "rays" for the vector observations of
+                ray_sensor (computed without rendering), or "none" for physics/reward-only rollouts:
+                step() and reset() return None as observation and never render (get_observation() still can).
+            lazy_obs (bool): with "pixels", return a LazyObservation which is only rendered when read
+            ray_sensor (utilities.sensors.RaySensor): sensor used with obs_type="rays" (default: RaySensor())
+            profile (bool or utilities.profiling.PhaseProfiler): time the phases of step() and reset()
+                (car_step, world_step, render, downsample, ray_sensor, info, create_track,
+                build_track, create_car, and the track_retry event count) into self.profiler
+                (a new PhaseProfiler if True, or the given one, e.g. shared by several environments)
+            profile_info (bool): with profile, add the latest duration (in ms) of every phase to the info
+                dict of step(), under "timings"
+            telemetry (utilities.telemetry.TelemetrySink): sink receiving a record of every episode (when the
+                next reset() or close() ends it) and, if the sink has step_records, of every step()
+            prefetch (int): if > 0, generate the tracks of up to this many next episodes in the background
+                (see utilities.prefetch.TrackPrefetcher), so that reset() only builds the bodies of a ready track.
+                The tracks (and sampled track parameters) are the same as without prefetching.
+            prefetch_process (bool): prefetch in a helper process instead of a thread
+            resolutions (list): with "pixels", list of (width, height) observation sizes: the observation is then
+                a tuple with one frame per size (in this order), all computed from a single render at the largest
+                width and height (which become STATE_W and STATE_H) by area averaging. The smaller frames are
+                written into buffers reused across steps.
+            info_keys (iterable): fields of the info dict of step(), among INFO_FIELDS (only these are computed:
+                e.g. () for an empty info dict, or add "nearest_obs_ahead_dist")
+        """
         EzPickle.__init__(self)
         self.seed()
         self.contactListener_keepref = FrictionDetector(self)
@@ -177,25 +351,145 @@ class CarRacingObstacles(gym.Env, EzPickle):
         )
         self.num_obstacles=0    # counts total number of obstacles presently in the track
         self.num_collisions=0   # counts total number of collisions with obstacles
+        self.num_tracks_generated=0     # counts tracks generated (cache misses), over the environment's lifetime
+        self.num_track_retries=0        # counts failed track generation attempts (tracks which did not close)
+        self.num_wheels_on_tiles=0      # number of wheels touching at least one tile (kept by FrictionDetector)
+        self.num_wheels_on_obstacles=0  # number of wheels touching at least one obstacle tile
 
         # Environment variables (previously globals)
         self.TRACK_TURN_RATE = 0.31
         self.OBSTACLE_PROB = 0.05            #probability of an obstacle
 
+        assert render_backend in ["gl", "numpy"]
+        self.render_backend = render_backend
+        self.rasterizer = None
+        self.track_cache = track_cache
+        self.pool_bodies = pool_bodies
+        self.reuse_car = reuse_car
+        assert frame_skip >= 1
+        self.frame_skip = frame_skip
+        assert obs_type in ["pixels", "rays", "none"]
+        self.obs_type = obs_type
+        self.ray_sensor = None
+        if self.obs_type == "rays":
+            self.ray_sensor = ray_sensor if ray_sensor is not None else RaySensor()
+            self.observation_space = self.ray_sensor.observation_space
+        self.lazy_obs = lazy_obs
+        self.resolutions = None
+        if resolutions is not None:
+            assert self.obs_type == "pixels" and not lazy_obs
+            self.resolutions = [(int(w), int(h)) for w, h in resolutions]
+            self.STATE_W = max(w for w, _ in self.resolutions)
+            self.STATE_H = max(h for _, h in self.resolutions)
+            self.observation_space = spaces.Tuple([
+                spaces.Box(low=0, high=255, shape=(h, w, 3), dtype=np.uint8) for w, h in self.resolutions
+            ])
+            # (None for the full-size frame, which is the render itself)
+            self.downsamplers = [
+                None if (w, h) == (self.STATE_W, self.STATE_H) else AreaDownsampler(self.STATE_W, self.STATE_H, w, h)
+                for w, h in self.resolutions
+            ]
+        if isinstance(profile, PhaseProfiler):
+            self.profiler = profile
+        else:
+            self.profiler = PhaseProfiler() if profile else None
+        self.profile_info = profile_info and self.profiler is not None
+        self.telemetry = telemetry
+        for key in info_keys:
+            assert key in INFO_FIELDS, f"unknown info key {key!r} (available: {list(INFO_FIELDS)})"
+        self.info_keys = tuple(info_keys)
+        self.info_fields = [(key, INFO_FIELDS[key]) for key in self.info_keys]
+        self.episode_index = -1     # incremented on every reset()
+        self.episode_steps = 0
+        self.episode_grass_steps = 0
+        self.episode_psi = None     # (TRACK_TURN_RATE, OBSTACLE_PROB) of the current episode
+        self.prefetcher = TrackPrefetcher(prefetch, prefetch_process) if prefetch > 0 else None
+        # Geometry of the next track, when it does not have to be generated (see _create_track())
+        self.pending_geometry = None
+        self.step_index = 0     # incremented on every step(), to know which observation is current
+        self.observation = None
+        self.observation_buffer = None
+        self.track_rasterized = False
+        self.tile_pool = []     # every tile body ever created (when pool_bodies is set)
+        # Retained GL geometry (see render_road()); the road is re-uploaded once per reset()
+        self.grass_vertex_list = None
+        self.road_vertex_list = None
+        self.indicator_vertex_list = None
+        self.recolored_tiles = []
+
     def seed(self, seed=None):
-        print(f"Random seed of CarRacing environment: {seed}")
+        logger.debug("Random seed of CarRacing environment: %s", seed)
         self.np_random, seed = seeding.np_random(seed)
+        self.last_seed = seed
+        # Tracks prefetched from the previous generator state are now stale (restarted on the next reset())
+        if getattr(self, "prefetcher", None) is not None:
+            self.prefetcher.stop()
         return [seed]
 
     def _destroy(self):
         if not self.road:
             return
+        # (Deactivating/destroying the tiles ends their contacts while the tile arrays are still valid)
         for t in self.road:
-            self.world.DestroyBody(t)
+            if self.pool_bodies:
+                t.active = False
+            else:
+                self.world.DestroyBody(t)
         self.road = []
-        self.car.destroy()
+        if self.reuse_car:
+            for body in [self.car.hull] + self.car.wheels:
+                body.active = False
+        else:
+            self.car.destroy()
 
     def _create_track(self):
+        """
+        Generates a random track (retrying until the loop closes), or loads it from the track cache.
+
+        Return:
+            dict of track arrays (see _create_tile_geometry())
+        """
+        if self.pending_geometry is not None:
+            geometry, self.pending_geometry = self.pending_geometry, None
+            return geometry
+
+        key = None
+        if self.track_cache is not None:
+            # Track generation (checkpoints and obstacles) only draws from self.np_random
+            key = self.track_cache.make_key(self.TRACK_TURN_RATE, self.OBSTACLE_PROB, self.np_random)
+            entry = self.track_cache.get(key)
+            if entry is not None:
+                # Leave the generator as if the track had been generated
+                set_rng_state_from_arrays("np_random", entry, self.np_random)
+                return {k: entry[k] for k in GEOMETRY_KEYS}
+
+        while True:
+            geometry = self._generate_track_geometry()
+            if geometry is not None:
+                break
+            self.num_track_retries += 1
+            if self.profiler is not None:
+                self.profiler.count("track_retry")
+            if self.verbose == 1:
+                logger.info(
+                    "retry to generate track (normal if there are not many "
+                    "instances of this message)"
+                )
+        self.num_tracks_generated += 1
+
+        if key is not None:
+            entry = dict(geometry)
+            entry.update(rng_state_to_arrays("np_random", self.np_random))
+            self.track_cache.put(key, entry)
+        return geometry
+
+    def _generate_track_geometry(self):
+        """
+        Generates the geometry of a random track (no Box2D bodies are created).
+
+        Return:
+            dict of track arrays (see _create_tile_geometry()), or None if the track did not close
+        """
         CHECKPOINTS = 12
 
         # Create checkpoints
@@ -214,7 +508,6 @@ class CarRacingObstacles(gym.Env, EzPickle):
                 rad = 1.5 * TRACK_RAD
 
             checkpoints.append((alpha, rad * math.cos(alpha), rad * math.sin(alpha)))
-        self.road = []
 
         # Go from one checkpoint to another to create track
         x, y, beta = 1.5 * TRACK_RAD, 0, 0
@@ -278,26 +571,18 @@ class CarRacingObstacles(gym.Env, EzPickle):
                 break
 
         # Find closed loop range i1..i2, first loop should be ignored, second is OK
-        i1, i2 = -1, -1
-        i = len(track)
-        while True:
-            i -= 1
-            if i == 0:
-                return False  # Failed
-            pass_through_start = (
-                track[i][0] > self.start_alpha and track[i - 1][0] <= self.start_alpha
-            )
-            if pass_through_start and i2 == -1:
-                i2 = i
-            elif pass_through_start and i1 == -1:
-                i1 = i
-                break
+        # (i2 is the last and i1 the second-to-last pass through the start angle)
+        alphas = np.array([step[0] for step in track])
+        pass_through_start = np.nonzero(
+            (alphas[1:] > self.start_alpha) & (alphas[:-1] <= self.start_alpha)
+        )[0] + 1
+        if len(pass_through_start) < 2:
+            return None  # Failed
+        i1, i2 = pass_through_start[-2], pass_through_start[-1]
         if self.verbose == 1:
-            print("Track generation: %i..%i -> %i-tiles track" % (i1, i2, i2 - i1))
-        assert i1 != -1
-        assert i2 != -1
+            logger.info("Track generation: %i..%i -> %i-tiles track", i1, i2, i2 - i1)
 
-        track = track[i1 : i2 - 1]
+        track = np.array(track[i1 : i2 - 1])
 
         first_beta = track[0][1]
         first_perp_x = math.cos(first_beta)
@@ -308,155 +593,373 @@ class CarRacingObstacles(gym.Env, EzPickle):
             + np.square(first_perp_y * (track[0][3] - track[-1][3]))
         )
         if well_glued_together > TRACK_DETAIL_STEP:
-            return False
-
-        # Red-white border on hard turns
-        border = [False] * len(track)
-        for i in range(len(track)):
-            good = True
-            oneside = 0
-            for neg in range(BORDER_MIN_COUNT):
-                beta1 = track[i - neg - 0][1]
-                beta2 = track[i - neg - 1][1]
-                good &= abs(beta1 - beta2) > self.TRACK_TURN_RATE * 0.2
-                oneside += np.sign(beta1 - beta2)
-            good &= abs(oneside) == BORDER_MIN_COUNT
-            border[i] = good
-        for i in range(len(track)):
-            for neg in range(BORDER_MIN_COUNT):
-                border[i - neg] |= border[i]
-
-        # Create tiles
-        last_obst_idx = 0
-        for i in range(len(track)):
-            alpha1, beta1, x1, y1 = track[i]
-            alpha2, beta2, x2, y2 = track[i - 1]
-            road1_l = (
-                x1 - TRACK_WIDTH * math.cos(beta1),
-                y1 - TRACK_WIDTH * math.sin(beta1),
-            )
-            road1_r = (
-                x1 + TRACK_WIDTH * math.cos(beta1),
-                y1 + TRACK_WIDTH * math.sin(beta1),
-            )
-            road2_l = (
-                x2 - TRACK_WIDTH * math.cos(beta2),
-                y2 - TRACK_WIDTH * math.sin(beta2),
-            )
-            road2_r = (
-                x2 + TRACK_WIDTH * math.cos(beta2),
-                y2 + TRACK_WIDTH * math.sin(beta2),
-            )
-            vertices = [road1_l, road1_r, road2_r, road2_l]
+            return None
+
+        border = self._find_borders(track[:, 1])
+        return self._create_tile_geometry(track, border)
+
+    def _find_borders(self, beta):
+        """
+        Flags the tiles which get a red-white border (hard turns).
 
-            # With probability OBSTACLE_PROB, add an obstacle,
-            # which is just a red-colored tile whose friction is equal to the
-            # OBSTACLE_PENALTY parameter, and which covers one half of the road surface.
-            if(np.random.uniform() < self.OBSTACLE_PROB and (i - last_obst_idx) > OBSTACLE_SPACING and not border[i]):
+        Equivalent to marking tile i if the last BORDER_MIN_COUNT heading changes are all large and
+        in the same direction, then extending each mark to the BORDER_MIN_COUNT - 1 preceding tiles
+        (in index order, wrapping around the start of the loop).
+
+        Args:
+            beta (np.ndarray): (N,) heading of every track tile
+
+        Return:
+            (N,) bool array
+        """
+        dbeta = beta - np.roll(beta, 1)  # dbeta[i] = beta[i] - beta[i - 1]
+        good = np.ones(len(beta), dtype=bool)
+        oneside = np.zeros(len(beta))
+        for neg in range(BORDER_MIN_COUNT):
+            shifted = np.roll(dbeta, neg)  # dbeta[i - neg]
+            good &= np.abs(shifted) > self.TRACK_TURN_RATE * 0.2
+            oneside += np.sign(shifted)
+        good &= np.abs(oneside) == BORDER_MIN_COUNT
+
+        # The marks of the first tiles wrap around to the last tiles before those are extended themselves
+        extended = good.copy()
+        for neg in range(1, BORDER_MIN_COUNT):
+            extended[len(beta) - neg :] |= good[:neg]
+        border = extended.copy()
+        for neg in range(1, BORDER_MIN_COUNT):
+            border |= np.roll(extended, -neg)  # border[i - neg] |= border[i]
+        return border
+
+    def _place_obstacles(self, border):
+        """
+        Decides which tiles get an obstacle and on which side of the road.
+
+        Draws from self.np_random (so the obstacles, like the rest of the track, are determined by the
+        environment seed) as placing them tile by tile would: one draw per tile, plus one draw for the
+        side of every placed obstacle.
+
+        Args:
+            border (np.ndarray): (N,) bool array of tiles with a border (which never get an obstacle)
+
+        Return:
+            (obstacle, left) pair of (N,) bool arrays
+        """
+        n = len(border)
+        obstacle = np.zeros(n, dtype=bool)
+        left = np.zeros(n, dtype=bool)
+        state = self.np_random.get_state()
+        draws = self.np_random.uniform(size=2 * n)
+        used = 0
+        last_obst_idx = 0
+        for i in range(n):
+            u = draws[used]
+            used += 1
+            if u < self.OBSTACLE_PROB and (i - last_obst_idx) > OBSTACLE_SPACING and not border[i]:
                 last_obst_idx = i
-                road1_mid = (x1,y1)
-                road2_mid = (x2,y2)
-                # Randomize either a left or right obstacle
-                # And make the road tile only cover the other half of the road
-                left_vertices = [road1_l, road1_mid, road2_mid, road2_l]
-                right_vertices = [road1_mid, road1_r, road2_r, road2_mid]
-                if(np.random.uniform() < 0.5):
-                    obst = left_vertices
-                    vertices = right_vertices
-                else:
-                    obst = right_vertices
-                    vertices = left_vertices
-                # Add obstacle centroid to list of centroids
-                self.obstacle_centroids.append(np.mean(np.array(obst), axis=0))
-                # Add obstacle tile
-                self._add_road_tile(i, obst, OBSTACLE_COLOR, OBSTACLE_PENALTY)
-                # Increment number of obstacles by 1.
-                self.num_obstacles += 1
-            # Add road tile
-            self._add_road_tile(i, vertices, ROAD_COLOR, 1.0)
-
-            if border[i]:
-                side = np.sign(beta2 - beta1)
-                b1_l = (
-                    x1 + side * TRACK_WIDTH * math.cos(beta1),
-                    y1 + side * TRACK_WIDTH * math.sin(beta1),
-                )
-                b1_r = (
-                    x1 + side * (TRACK_WIDTH + BORDER) * math.cos(beta1),
-                    y1 + side * (TRACK_WIDTH + BORDER) * math.sin(beta1),
-                )
-                b2_l = (
-                    x2 + side * TRACK_WIDTH * math.cos(beta2),
-                    y2 + side * TRACK_WIDTH * math.sin(beta2),
-                )
-                b2_r = (
-                    x2 + side * (TRACK_WIDTH + BORDER) * math.cos(beta2),
-                    y2 + side * (TRACK_WIDTH + BORDER) * math.sin(beta2),
-                )
-                self.road_poly.append(
-                    ([b1_l, b1_r, b2_r, b2_l], (1, 1, 1) if i % 2 == 0 else (1, 0, 0))
-                )
-        self.track = track
-        return True
+                obstacle[i] = True
+                left[i] = draws[used] < 0.5
+                used += 1
+        # Rewind so that exactly the used draws are consumed from the stream
+        self.np_random.set_state(state)
+        self.np_random.uniform(size=used)
+        return obstacle, left
+
+    def _create_tile_geometry(self, track, border):
+        """
+        Computes the polygons of the road, obstacle and border tiles as arrays.
+
+        Args:
+            track (np.ndarray): (N, 4) array of (alpha, beta, x, y) track points
+            border (np.ndarray): (N,) bool array of tiles with a border
+
+        Return:
+            dict with the following entries (polygons in road_poly drawing order):
+            - 'track': the track points
+            - 'poly_vertices': (P, 4, 2) polygon vertices
+            - 'poly_colors': (P, 3) polygon colors
+            - 'poly_friction': (P,) friction of the tile (obstacles: OBSTACLE_PENALTY)
+            - 'poly_is_tile': (P,) False for border polygons, which have no Box2D body
+            - 'obstacle_centroids': (K, 2) centroids of the obstacle tiles
+        """
+        n = len(track)
+        beta1, x1, y1 = track[:, 1], track[:, 2], track[:, 3]
+        beta2, x2, y2 = np.roll(beta1, 1), np.roll(x1, 1), np.roll(y1, 1)  # track[i - 1]
+        cos1, sin1 = np.cos(beta1), np.sin(beta1)
+        cos2, sin2 = np.cos(beta2), np.sin(beta2)
+        road1_l = np.stack([x1 - TRACK_WIDTH * cos1, y1 - TRACK_WIDTH * sin1], axis=1)
+        road1_r = np.stack([x1 + TRACK_WIDTH * cos1, y1 + TRACK_WIDTH * sin1], axis=1)
+        road2_l = np.stack([x2 - TRACK_WIDTH * cos2, y2 - TRACK_WIDTH * sin2], axis=1)
+        road2_r = np.stack([x2 + TRACK_WIDTH * cos2, y2 + TRACK_WIDTH * sin2], axis=1)
+        road1_mid = np.stack([x1, y1], axis=1)
+        road2_mid = np.stack([x2, y2], axis=1)
+        road = np.stack([road1_l, road1_r, road2_r, road2_l], axis=1)
+
+        # With probability OBSTACLE_PROB, add an obstacle,
+        # which is just a red-colored tile whose friction is equal to the
+        # OBSTACLE_PENALTY parameter, and which covers one half of the road surface.
+        # The road tile then only covers the other half of the road.
+        obstacle, left = self._place_obstacles(border)
+        left_half = np.stack([road1_l, road1_mid, road2_mid, road2_l], axis=1)
+        right_half = np.stack([road1_mid, road1_r, road2_r, road2_mid], axis=1)
+        obst = np.where(left[:, None, None], left_half, right_half)[obstacle]
+        road[obstacle] = np.where(left[:, None, None], right_half, left_half)[obstacle]
+
+        side = np.sign(beta2 - beta1)
+        border_vertices = np.stack([
+            np.stack([x1 + side * TRACK_WIDTH * cos1, y1 + side * TRACK_WIDTH * sin1], axis=1),
+            np.stack([x1 + side * (TRACK_WIDTH + BORDER) * cos1, y1 + side * (TRACK_WIDTH + BORDER) * sin1], axis=1),
+            np.stack([x2 + side * (TRACK_WIDTH + BORDER) * cos2, y2 + side * (TRACK_WIDTH + BORDER) * sin2], axis=1),
+            np.stack([x2 + side * TRACK_WIDTH * cos2, y2 + side * TRACK_WIDTH * sin2], axis=1),
+        ], axis=1)[border]
+
+        # Interleave the polygons as: [obstacle tile], road tile, [border] for every track tile
+        idx = np.arange(n)
+        shade = 0.01 * (idx % 3)
+        order = np.concatenate([idx[obstacle] * 3, idx * 3 + 1, idx[border] * 3 + 2])
+        poly_vertices = np.concatenate([obst, road, border_vertices])
+        poly_colors = np.concatenate([
+            np.array(OBSTACLE_COLOR) + shade[obstacle, None],
+            np.array(ROAD_COLOR) + shade[:, None],
+            np.where((idx[border] % 2 == 0)[:, None], [1.0, 1.0, 1.0], [1.0, 0.0, 0.0]),
+        ])
+        poly_friction = np.concatenate([
+            np.full(obstacle.sum(), OBSTACLE_PENALTY), np.ones(n), np.zeros(border.sum())
+        ])
+        poly_is_tile = np.concatenate([
+            np.ones(obstacle.sum() + n, dtype=bool), np.zeros(border.sum(), dtype=bool)
+        ])
+        perm = np.argsort(order, kind="stable")
+        return {
+            "track": track,
+            "poly_vertices": poly_vertices[perm],
+            "poly_colors": poly_colors[perm],
+            "poly_friction": poly_friction[perm],
+            "poly_is_tile": poly_is_tile[perm],
+            "obstacle_centroids": obst.mean(axis=1).reshape(-1, 2),
+        }
+
+    def _build_track(self, geometry):
+        """
+        Creates the Box2D tile bodies (and road_poly) of a track from its geometry.
+
+        The tile state is kept in arrays indexed by the tile id stored in each tile body's userData:
+        - tile_friction, tile_is_obstacle: static properties of each tile
+        - tile_visited, tile_in_contact, tile_contact_count: updated by FrictionDetector
+        - tile_poly_index: index of each tile in road_poly/poly_colors
+        poly_colors holds the (mutable) colors of all road_poly polygons, including the borders.
 
-    def _add_road_tile(self, idx, vertices, tile_color, tile_friction):
-        """Add a road tile to the track.
         Args:
-            idx: Index of the tile.
+            geometry (dict): track geometry, as returned by _generate_track_geometry()
+        """
+        is_tile = np.asarray(geometry["poly_is_tile"], dtype=bool)
+        self.poly_colors = np.array(geometry["poly_colors"], dtype=np.float64)
+        self.tile_poly_index = np.nonzero(is_tile)[0]
+        self.tile_friction = np.asarray(geometry["poly_friction"], dtype=np.float64)[is_tile]
+        self.tile_is_obstacle = self.tile_friction > 2.0
+        num_tiles = len(self.tile_poly_index)
+        self.tile_visited = np.zeros(num_tiles, dtype=bool)
+        self.tile_in_contact = np.zeros(num_tiles, dtype=bool)
+        self.tile_contact_count = np.zeros(num_tiles, dtype=np.int64)
+
+        self.road = []
+        for i, vertices in enumerate(geometry["poly_vertices"]):
+            vertices = [tuple(v) for v in vertices.tolist()]
+            if is_tile[i]:
+                self._add_road_tile(vertices, self.tile_friction[len(self.road)])
+            # road_poly colors are views into poly_colors, so they follow the recoloring
+            self.road_poly.append((vertices, self.poly_colors[i]))
+        self._trim_tile_pool()
+        self.obstacle_polygons = np.asarray(geometry["poly_vertices"])[self.tile_poly_index[self.tile_is_obstacle]]
+        self.obstacle_centroids = geometry["obstacle_centroids"]
+        self.num_obstacles = len(self.obstacle_centroids)
+        # Built once per track, queried on every step()
+        self.obstacle_index = utils.ObstacleIndex(self.obstacle_centroids)
+        self.track = geometry["track"]
+
+    def _add_road_tile(self, vertices, tile_friction):
+        """Add a road tile body to the track.
+        Args:
             vertices: List of 4 vertices of the tile.
-            tile_color: Color of the tile.
             tile_friction: Friction of the tile.
         """
-        self.fd_tile.shape.vertices = vertices
-        t = self.world.CreateStaticBody(fixtures=self.fd_tile)
-        t.userData = t
-        c = 0.01 * (idx % 3)
-        t.color = np.array(tile_color) + c
-        t.road_visited = False
-        t.road_friction = tile_friction
-        t.fixtures[0].sensor = True
-        t.currently_in_contact = False
-        self.road_poly.append(([vertices[0], vertices[1], vertices[2], vertices[3]], t.color))
+        tile_id = len(self.road)
+        if self.pool_bodies and tile_id < len(self.tile_pool):
+            # Reuse a pooled (inactive) body: its broad-phase proxy is rebuilt with the new
+            # vertices when it is activated
+            t = self.tile_pool[tile_id]
+            t.fixtures[0].shape.vertices = vertices
+            t.active = True
+        else:
+            self.fd_tile.shape.vertices = vertices
+            t = self.world.CreateStaticBody(fixtures=self.fd_tile)
+            t.fixtures[0].sensor = True
+            if self.pool_bodies:
+                self.tile_pool.append(t)
+        t.userData = tile_id
+        t.road_friction = float(tile_friction)
         self.road.append(t)
 
+    def _trim_tile_pool(self):
+        """
+        Destroys the pooled (inactive) tile bodies beyond TILE_POOL_HIGH_WATER times the current number of
+        tiles, so that one exceptionally long track does not leave its bodies in the world for good.
+        """
+        keep = max(int(TILE_POOL_HIGH_WATER * len(self.road)), len(self.road))
+        if len(self.tile_pool) <= keep:
+            return
+        for t in self.tile_pool[keep:]:
+            self.world.DestroyBody(t)
+        del self.tile_pool[keep:]
+
+    def _end_episode(self):
+        """
+        Sends the record of the current episode (if it has any step) to the telemetry sink.
+        """
+        if self.telemetry is None or self.episode_steps == 0:
+            return
+        self.telemetry.record_episode((
+            self.episode_index, self.last_seed, self.episode_psi[0], self.episode_psi[1],
+            len(self.track), self.num_obstacles, self.num_collisions, self.tile_visited_count,
+            self.reward, self.episode_steps, self.episode_grass_steps, self.t,
+        ))
+        self.episode_steps = 0
+
+    def prefetch_sampler(self):
+        """
+        Returns the sampler of the track parameters of the next episodes, used by the track prefetcher
+        (subclasses which sample them in reset() return a sampler drawing the same values).
+        """
+        return FixedPsi(self.TRACK_TURN_RATE, self.OBSTACLE_PROB)
+
+    def set_sampler_state(self, state):
+        """
+        Restores the state of the generator the track parameters are drawn from, as left by the prefetch
+        sampler after drawing the parameters of a prefetched track (no such generator here).
+        """
+
+    def _take_prefetched_track(self):
+        """
+        Takes the next track from the prefetcher: sets the track parameters it was generated with, leaves
+        np_random as if it had been generated here, and makes it the track of the next _create_track() call.
+        """
+        prefetcher = self.prefetcher
+        current = FixedPsi(self.TRACK_TURN_RATE, self.OBSTACLE_PROB)
+        if prefetcher.worker is None or (isinstance(prefetcher.sampler, FixedPsi) and prefetcher.sampler != current):
+            prefetcher.restart(self.np_random.get_state(), self.prefetch_sampler())
+        K, p, geometry, rng_state, retries, sampler_state = prefetcher.get()
+        self.TRACK_TURN_RATE = K
+        self.OBSTACLE_PROB = p
+        self.np_random.set_state(rng_state)
+        self.set_sampler_state(sampler_state)
+        self.num_track_retries += retries
+        self.num_tracks_generated += 1
+        self.pending_geometry = geometry
+
     def reset(self):
+        self._end_episode()
+        if self.prefetcher is not None and self.pending_geometry is None:
+            self._take_prefetched_track()
         self._destroy()
+        self.episode_index += 1
+        self.episode_steps = 0
+        self.episode_grass_steps = 0
         self.reward = 0.0
         self.prev_reward = 0.0
         self.tile_visited_count = 0
         self.t = 0.0
         self.road_poly = []
+        self._delete_road_vertex_list()
         self.obstacle_centroids = []
         self.num_obstacles = 0
         self.num_collisions = 0
 
-        while True:
-            success = self._create_track()
-            if success:
-                break
-            if self.verbose == 1:
-                print(
-                    "retry to generate track (normal if there are not many"
-                    "instances of this message)"
-                )
-        self.car = Car(self.world, *self.track[0][1:4])
-
-        print(f"Total number of obstacles in the track: {self.num_obstacles}")
+        profiler = self.profiler
+        if profiler is not None:
+            t = perf_counter_ns()
+        geometry = self._create_track()
+        if profiler is not None:
+            t = profiler.record("create_track", t)
+        self.episode_psi = (self.TRACK_TURN_RATE, self.OBSTACLE_PROB)
+        self._build_track(geometry)
+        if profiler is not None:
+            t = profiler.record("build_track", t)
+        self._create_car()
+        if profiler is not None:
+            profiler.record("create_car", t)
+        if self.ray_sensor is not None:
+            self.ray_sensor.set_track(self.track, TRACK_WIDTH, self.obstacle_polygons)
+        # The "numpy" backend pre-rasterizes the track the first time it renders it
+        self.track_rasterized = False
+
+        logger.debug("Total number of obstacles in the track: %d", self.num_obstacles)
 
         return self.step(None)[0]
 
-    def step(self, action):
+    def _create_car(self):
+        """
+        Creates the car at the start of the track (or moves it there, if reuse_car is set).
+        """
+        init_angle, init_x, init_y = self.track[0][1:4]
+        if self.reuse_car and self.car is not None:
+            self._reposition_car(init_angle, init_x, init_y)
+        else:
+            self.car = Car(self.world, init_angle, init_x, init_y)
+        for w in self.car.wheels:
+            w.num_obstacle_tiles = 0
+        self.num_wheels_on_tiles = 0
+        self.num_wheels_on_obstacles = 0
+
+    def _reposition_car(self, init_angle, init_x, init_y):
+        """
+        Puts the (deactivated) car back into the state Car.__init__() creates it in, at the given pose.
+        """
+        car = self.car
+        car.hull.position = (init_x, init_y)
+        car.hull.angle = init_angle
+        for w, (wx, wy) in zip(car.wheels, WHEELPOS):
+            # Same (unrotated) wheel offsets as Car.__init__()
+            w.position = (init_x + wx * SIZE, init_y + wy * SIZE)
+            w.angle = init_angle
+            w.gas = 0.0
+            w.brake = 0.0
+            w.steer = 0.0
+            w.phase = 0.0
+            w.omega = 0.0
+            w.skid_start = None
+            w.skid_particle = None
+            w.tiles.clear()
+            w.joint.motorSpeed = 0.0
+        for body in [car.hull] + car.wheels:
+            body.linearVelocity = (0, 0)
+            body.angularVelocity = 0.0
+            body.active = True
+            body.awake = True
+        car.particles = []
+        car.fuel_spent = 0.0
+
+    def _simulate(self, action):
+        """
+        Advances the simulation by one frame (1 / FPS seconds) with the given action.
+
+        Return:
+            (reward of the frame, done)
+        """
         if action is not None:
             self.car.steer(-action[0])
             self.car.gas(action[1])
             self.car.brake(action[2])
 
+        profiler = self.profiler
+        if profiler is not None:
+            t = perf_counter_ns()
         self.car.step(1.0 / FPS)
+        if profiler is not None:
+            t = profiler.record("car_step", t)
         self.world.Step(1.0 / FPS, 6 * 30, 2 * 30)
+        if profiler is not None:
+            profiler.record("world_step", t)
         self.t += 1.0 / FPS
 
-        self.state = self.render("state_pixels")
-
         step_reward = 0
         done = False
         if action is not None:  # First step without action, called from reset()
@@ -472,42 +975,122 @@ class CarRacingObstacles(gym.Env, EzPickle):
             if abs(x) > PLAYFIELD or abs(y) > PLAYFIELD:
                 done = True
                 step_reward = -100
+        return step_reward, done
 
-        # Determine whether the car is currently on the grass, road, or obstacle,
-        # and populate the bg_category variable accordingly.
-        # Let (0,1,2) correspond to (grass, road, obstacle).
-        bg_category = 0
-        if utils.check_if_car_on_grass(self.car):
-            bg_category = 0
-        elif utils.check_if_car_on_obstacle(self.car):
-            bg_category = 2
+    def step(self, action):
+        # Repeat the action for frame_skip frames (stopping early if the episode ends),
+        # but only render the observation and compute the info of the last one.
+        # Car.gas() ramps up the throttle on every call, so the action is re-applied every frame,
+        # exactly as an action-repeat wrapper would.
+        num_frames = self.frame_skip if action is not None else 1
+        step_reward = 0
+        for _ in range(num_frames):
+            frame_reward, done = self._simulate(action)
+            step_reward += frame_reward
+            if done:
+                break
+
+        self.step_index += 1
+        self.observation = None
+        profiler = self.profiler
+        if self.obs_type == "none":
+            self.state = None
+        elif self.obs_type == "rays":
+            if profiler is not None:
+                t = perf_counter_ns()
+            self.state = self.ray_sensor.observe(self.car)
+            if profiler is not None:
+                profiler.record("ray_sensor", t)
+        elif self.lazy_obs:
+            self.state = LazyObservation(self)
+        elif self.resolutions is not None:
+            self.state = self.get_observations()
         else:
-            bg_category = 1
+            self.state = self.get_observation()
 
-        return self.state, step_reward, done, \
-            {"num_obstacles": self.num_obstacles, "num_collisions": self.num_collisions, \
-             "background": bg_category, "nearest_obs_dist": utils.get_nearest_obstacle_distance(self.car, self.obstacle_centroids)}
+        if profiler is not None:
+            t = perf_counter_ns()
+        info = self.get_info()
+        if profiler is not None:
+            profiler.record("info", t)
 
-    def render(self, mode="human"):
-        assert mode in ["human", "state_pixels", "rgb_array"]
-        if self.viewer is None:
-            from gym.envs.classic_control import rendering
+        if action is not None:
+            self.episode_steps += 1
+            bg_category = self.background_category()
+            if bg_category == 0:
+                self.episode_grass_steps += 1
+            if self.telemetry is not None and self.telemetry.step_records:
+                nearest_obs_dist = info.get("nearest_obs_dist")
+                if nearest_obs_dist is None:
+                    nearest_obs_dist = utils.get_nearest_obstacle_distance(self.car, self.obstacle_index)
+                self.telemetry.record_step((
+                    self.episode_index, self.episode_steps, step_reward, self.reward,
+                    bg_category, self.num_collisions, nearest_obs_dist,
+                ))
+
+        if self.profile_info:
+            info["timings"] = profiler.last_ms()
+        return self.state, step_reward, done, info
+
+    def background_category(self):
+        """
+        Returns the surface the car is on: 0 (grass: no wheel touches any tile), 2 (obstacle: a wheel touches
+        an obstacle tile) or 1 (road), from the wheel counters kept by FrictionDetector.
+        """
+        if self.num_wheels_on_tiles == 0:
+            return 0
+        if self.num_wheels_on_obstacles > 0:
+            return 2
+        return 1
 
-            self.viewer = rendering.Viewer(WINDOW_W, WINDOW_H)
-            self.score_label = pyglet.text.Label(
-                "0000",
-                font_size=36,
-                x=20,
-                y=WINDOW_H * 2.5 / 40.00,
-                anchor_x="left",
-                anchor_y="center",
-                color=(255, 255, 255, 255),
-            )
-            self.transform = rendering.Transform()
+    def get_info(self):
+        """
+        Returns the info dict of the current state, with the fields in self.info_keys.
+        """
+        return {key: field(self) for key, field in self.info_fields}
 
-        if "t" not in self.__dict__:
-            return  # reset() not called yet
+    def get_observation(self):
+        """
+        Returns the state_pixels observation of the current state, rendering it on first use
+        (so it is rendered at most once per step(), whatever obs_type and lazy_obs are).
+        """
+        if self.observation is None:
+            if self.profiler is not None:
+                t = perf_counter_ns()
+            self.observation = self.render("state_pixels", out=self.observation_buffer)
+            if self.profiler is not None:
+                self.profiler.record("render", t)
+        return self.observation
+
+    def get_observations(self):
+        """
+        Returns the observation frames at every size of self.resolutions, from one state_pixels render.
+        """
+        frame = self.get_observation()
+        if self.profiler is not None:
+            t = perf_counter_ns()
+        frames = tuple(frame if downsample is None else downsample(frame) for downsample in self.downsamplers)
+        if self.profiler is not None:
+            self.profiler.record("downsample", t)
+        return frames
+
+    def set_observation_buffer(self, out):
+        """
+        Makes the state_pixels observations be rendered directly into out (e.g. a slot of a replay buffer or
+        a shared-memory array), which is then returned as observation. The buffer is reused by every
+        following step() until it is replaced (or reset to a new array per observation with out=None).
 
+        Args:
+            out (np.ndarray): C-contiguous (STATE_H, STATE_W, 3) uint8 array, or None
+        """
+        if out is not None:
+            assert out.shape == (self.STATE_H, self.STATE_W, 3) and out.dtype == np.uint8 and out.flags.c_contiguous
+        self.observation_buffer = out
+
+    def _camera(self):
+        """
+        Returns the camera (zoom, scroll_x, scroll_y, angle) following the car.
+        """
         # Animate zoom first second:
         zoom = 0.1 * SCALE * max(1 - self.t, 0) + ZOOM * SCALE * min(self.t, 1)
         scroll_x = self.car.hull.position[0]
@@ -516,14 +1099,72 @@ class CarRacingObstacles(gym.Env, EzPickle):
         vel = self.car.hull.linearVelocity
         if np.linalg.norm(vel) > 0.5:
             angle = math.atan2(vel[0], vel[1])
-        self.transform.set_scale(zoom, zoom)
-        self.transform.set_translation(
-            WINDOW_W / 2
-            - (scroll_x * zoom * math.cos(angle) - scroll_y * zoom * math.sin(angle)),
-            WINDOW_H / 4
-            - (scroll_x * zoom * math.sin(angle) + scroll_y * zoom * math.cos(angle)),
+        return zoom, scroll_x, scroll_y, angle
+
+    def _reset_rasterizer(self):
+        """
+        Pre-rasterizes the current track for the "numpy" render backend.
+        """
+        if self.rasterizer is None:
+            # Resolution of the track image: ~1 track pixel per observation pixel at full zoom
+            pixels_per_unit = ZOOM * SCALE * max(self.STATE_W / WINDOW_W, self.STATE_H / WINDOW_H)
+            self.rasterizer = TrackRasterizer(self.STATE_W, self.STATE_H, WINDOW_W, WINDOW_H,
+                                              PLAYFIELD, pixels_per_unit)
+        self.rasterizer.set_track(self.road_poly)
+        self.track_rasterized = True
+
+    def _car_polygons(self):
+        """
+        Returns the car body/wheel polygons (in world coordinates) drawn by Car.draw(), without particles.
+        """
+        polygons = []
+        for obj in self.car.drawlist:
+            for f in obj.fixtures:
+                trans = f.body.transform
+                path = [trans * v for v in f.shape.vertices]
+                polygons.append(([(p[0], p[1]) for p in path], obj.color))
+        return polygons
+
+    def _render_state_numpy(self, out=None):
+        """
+        Renders the state_pixels observation with the headless NumPy rasterizer (into out, if given).
+        """
+        if not self.track_rasterized:
+            self._reset_rasterizer()
+        polygons, colors = self._indicator_polygons(WINDOW_W, WINDOW_H)
+        hud_quads = np.array(polygons).reshape(-1, 4, 3)[:, :, :2]
+        hud_colors = np.array(colors).reshape(-1, 4, 4)[:, 0, :3]
+        return self.rasterizer.render(
+            self._camera(),
+            self.poly_colors,
+            self._car_polygons(),
+            hud_quads,
+            hud_colors,
+            out=out,
         )
-        self.transform.set_rotation(angle)
+
+    def render(self, mode="human", out=None):
+        """
+        Args:
+            mode (str): "human", "state_pixels" or "rgb_array"
+            out (np.ndarray): optional C-contiguous (H, W, 3) uint8 array the "state_pixels"/"rgb_array" frame
+                is written to (otherwise a new array is returned)
+        """
+        assert mode in ["human", "state_pixels", "rgb_array"]
+        if mode == "state_pixels" and self.render_backend == "numpy":
+            if "t" not in self.__dict__:
+                return  # reset() not called yet
+            return self._render_state_numpy(out)
+        if self.viewer is None:
+            from gym.envs.classic_control import rendering
+
+            self.viewer = rendering.Viewer(WINDOW_W, WINDOW_H)
+            self._create_gl_objects()
+
+        if "t" not in self.__dict__:
+            return  # reset() not called yet
+
+        self._update_transform()
 
         self.car.draw(self.viewer, mode != "state_pixels")
 
@@ -550,6 +1191,13 @@ class CarRacingObstacles(gym.Env, EzPickle):
             VP_H = int(pixel_scale * WINDOW_H)
 
         gl.glViewport(0, 0, VP_W, VP_H)
+        if mode != "human":
+            # Render upside down, so that the bottom-up glReadPixels() rows come out top-down
+            gl.glMatrixMode(gl.GL_PROJECTION)
+            gl.glPushMatrix()
+            gl.glLoadIdentity()
+            gl.glOrtho(0, win.width, win.height, 0, -1, 1)
+            gl.glMatrixMode(gl.GL_MODELVIEW)
         t.enable()
         self.render_road()
         for geom in self.viewer.onetime_geoms:
@@ -562,21 +1210,134 @@ class CarRacingObstacles(gym.Env, EzPickle):
             win.flip()
             return self.viewer.isopen
 
-        image_data = (
-            pyglet.image.get_buffer_manager().get_color_buffer().get_image_data()
+        gl.glMatrixMode(gl.GL_PROJECTION)
+        gl.glPopMatrix()
+        gl.glMatrixMode(gl.GL_MODELVIEW)
+
+        # Read the RGB pixels straight into the (contiguous) output array
+        if out is None:
+            out = np.empty((VP_H, VP_W, 3), dtype=np.uint8)
+        assert out.shape == (VP_H, VP_W, 3) and out.dtype == np.uint8 and out.flags.c_contiguous
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        gl.glReadPixels(
+            0, 0, VP_W, VP_H, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, out.ctypes.data_as(ctypes.POINTER(gl.GLubyte))
         )
-        arr = np.fromstring(image_data.get_data(), dtype=np.uint8, sep="")
-        arr = arr.reshape(VP_H, VP_W, 4)
-        arr = arr[::-1, :, 0:3]
+        arr = out
 
         return arr
 
+    def _create_gl_objects(self):
+        """
+        Creates the score label and the camera transform (which need a GL context, but no particular window).
+        """
+        from gym.envs.classic_control import rendering
+
+        self.score_label = pyglet.text.Label(
+            "0000",
+            font_size=36,
+            x=20,
+            y=WINDOW_H * 2.5 / 40.00,
+            anchor_x="left",
+            anchor_y="center",
+            color=(255, 255, 255, 255),
+        )
+        self.transform = rendering.Transform()
+
+    def _update_transform(self):
+        """
+        Points the camera transform at the car (see _camera()).
+        """
+        zoom, scroll_x, scroll_y, angle = self._camera()
+        self.transform.set_scale(zoom, zoom)
+        self.transform.set_translation(
+            WINDOW_W / 2
+            - (scroll_x * zoom * math.cos(angle) - scroll_y * zoom * math.sin(angle)),
+            WINDOW_H / 4
+            - (scroll_x * zoom * math.sin(angle) + scroll_y * zoom * math.cos(angle)),
+        )
+        self.transform.set_rotation(angle)
+
+    def _draw_state_gl(self):
+        """
+        Draws the state_pixels scene (road, car and indicators, in window coordinates) into the current GL
+        context, viewport and projection, without any window of this environment (used by
+        utilities.gl_atlas.GLAtlasRenderer).
+        """
+        if "transform" not in self.__dict__:
+            self._create_gl_objects()
+        self._update_transform()
+        collector = _GeomCollector()
+        self.car.draw(collector, False)
+        self.transform.enable()
+        self.render_road()
+        for geom in collector.onetime_geoms:
+            geom.render()
+        self.transform.disable()
+        self.render_indicators(WINDOW_W, WINDOW_H)
+
     def close(self):
+        self._end_episode()
+        if self.prefetcher is not None:
+            self.prefetcher.close()
         if self.viewer is not None:
             self.viewer.close()
             self.viewer = None
+            # Vertex lists belong to the (now destroyed) window's GL context
+            self.grass_vertex_list = None
+            self.road_vertex_list = None
+            self.indicator_vertex_list = None
+
+    def _delete_road_vertex_list(self):
+        """
+        Releases the uploaded road geometry (it is rebuilt on the next render_road() call).
+        """
+        if self.road_vertex_list is not None:
+            self.road_vertex_list.delete()
+            self.road_vertex_list = None
+        self.recolored_tiles = []
 
     def render_road(self):
+        """
+        Draws the grass and the road, keeping the geometry in GPU buffers between frames.
+
+        The grass never changes, and the road polygons only change on reset(); per frame, only the
+        colors of the tiles recolored by FrictionDetector since the last frame are updated.
+        """
+        if self.grass_vertex_list is None:
+            self.grass_vertex_list = self._create_grass_vertex_list()
+        if self.road_vertex_list is None:
+            self.road_vertex_list = self._create_road_vertex_list()
+            self.recolored_tiles = []
+        elif self.recolored_tiles:
+            colors = self.road_vertex_list.colors
+            for i in self.recolored_tiles:
+                color = self.poly_colors[i]
+                colors[16 * i : 16 * i + 16] = [color[0], color[1], color[2], 1] * 4
+            self.recolored_tiles = []
+        self.grass_vertex_list.draw(gl.GL_QUADS)
+        if self.road_vertex_list is not None:
+            self.road_vertex_list.draw(gl.GL_QUADS)
+
+    def _create_road_vertex_list(self):
+        """
+        Uploads the road_poly quads (road, obstacle and border tiles) to a vertex list.
+        """
+        if not self.road_poly:
+            return None
+        polygons_ = []
+        colors = []
+        for poly, color in self.road_poly:
+            colors.extend([color[0], color[1], color[2], 1] * len(poly))
+            for p in poly:
+                polygons_.extend([p[0], p[1], 0])
+        return pyglet.graphics.vertex_list(
+            len(polygons_) // 3, ("v3f/static", polygons_), ("c4f/dynamic", colors)
+        )
+
+    def _create_grass_vertex_list(self):
+        """
+        Uploads the (static) grass background and grid quads to a vertex list.
+        """
         colors = [0.4, 0.8, 0.4, 1.0] * 4
         polygons_ = [
             +PLAYFIELD,
@@ -614,18 +1375,27 @@ class CarRacingObstacles(gym.Env, EzPickle):
                     ]
                 )
 
-        for poly, color in self.road_poly:
-            colors.extend([color[0], color[1], color[2], 1] * len(poly))
-            for p in poly:
-                polygons_.extend([p[0], p[1], 0])
-
-        vl = pyglet.graphics.vertex_list(
-            len(polygons_) // 3, ("v3f", polygons_), ("c4f", colors)
-        )  # gl.GL_QUADS,
-        vl.draw(gl.GL_QUADS)
-        vl.delete()
+        return pyglet.graphics.vertex_list(
+            len(polygons_) // 3, ("v3f/static", polygons_), ("c4f/static", colors)
+        )
 
     def render_indicators(self, W, H):
+        polygons, colors = self._indicator_polygons(W, H)
+        # The HUD always has the same quads, so only their vertices are updated every frame
+        if self.indicator_vertex_list is None:
+            self.indicator_vertex_list = pyglet.graphics.vertex_list(
+                len(polygons) // 3, ("v3f/stream", polygons), ("c4f/static", colors)
+            )
+        else:
+            self.indicator_vertex_list.vertices[:] = polygons
+        self.indicator_vertex_list.draw(gl.GL_QUADS)
+        self.score_label.text = "%04i" % self.reward
+        self.score_label.draw()
+
+    def _indicator_polygons(self, W, H):
+        """
+        Returns the (flat) vertex and color lists of the HUD quads at the bottom of the window.
+        """
         s = W / 40.0
         h = H / 40.0
         colors = [0, 0, 0, 1] * 4
@@ -681,18 +1451,15 @@ class CarRacingObstacles(gym.Env, EzPickle):
         vertical_ind(10, 0.01 * self.car.wheels[3].omega, (0.2, 0, 1))
         horiz_ind(20, -10.0 * self.car.wheels[0].joint.angle, (0, 1, 0))
         horiz_ind(30, -0.8 * self.car.hull.angularVelocity, (1, 0, 0))
-        vl = pyglet.graphics.vertex_list(
-            len(polygons) // 3, ("v3f", polygons), ("c4f", colors)
-        )  # gl.GL_QUADS,
-        vl.draw(gl.GL_QUADS)
-        vl.delete()
-        self.score_label.text = "%04i" % self.reward
-        self.score_label.draw()
+        return polygons, colors
 
 
 if __name__ == "__main__":
     from pyglet.window import key
 
+    # Show the environment's track generation messages
+    logging.basicConfig(level=logging.INFO)
+
     a = np.array([0.0, 0.0, 0.0])
 
     def key_press(k, mod):
@@ -724,9 +1491,9 @@ if __name__ == "__main__":
     env.viewer.window.on_key_release = key_release
     record_video = False
     if record_video:
-        from gym.wrappers.monitor import Monitor
+        from utilities.video import AsyncFrameRecorder
 
-        env = Monitor(env, "/tmp/video-test", force=True)
+        env = AsyncFrameRecorder(env, "/tmp/video-test", episode_trigger=lambda episode: True)
     isopen = True
     while isopen:
         env.reset()
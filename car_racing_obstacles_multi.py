@@ -0,0 +1,197 @@
+## Version of CarRacing-obstacles where several cars drive on one track, inside a single Box2D world.
+
+import numpy as np
+from gym import spaces
+from gym.envs.box2d.car_dynamics import Car
+
+from car_racing_obstacles import CarRacingObstacles, FrictionDetector, DEFAULT_INFO_KEYS, FPS, PLAYFIELD
+import utilities.utils as utils
+
+# Info fields of MultiCarRacingObstacles.step() (same meaning as in car_racing_obstacles.INFO_FIELDS, as
+# (num_cars,) arrays); only the requested ones are computed
+MULTI_INFO_FIELDS = {
+    "num_obstacles": lambda env: np.full(env.num_cars, env.num_obstacles),
+    "num_collisions": lambda env: env.num_collisions.copy(),
+    "background": lambda env: env.background_categories(),
+    "wheels_on_grass": lambda env: 4 - env.wheels_on_tiles,
+    "tile_visited_count": lambda env: env.tile_visited_count.copy(),
+    "nearest_obs_dist": lambda env: env.obstacle_index.nearest_distance(
+        np.array([utils.get_car_position(car) for car in env.cars])
+    ),
+}
+
+class MultiCarFrictionDetector(FrictionDetector):
+    """
+    Contact listener routing the wheel/tile contacts to the bookkeeping of the car owning the wheel
+    (every wheel has a car_index attribute).
+    """
+    def _contact(self, contact, begin):
+        tile, obj = self._find_tile(contact)
+        if tile is None:
+            return
+        env = self.env
+        is_obstacle = env.tile_is_obstacle[tile]
+        self._recolor(tile, is_obstacle)
+        if not obj or "car_index" not in obj.__dict__:
+            return
+        k = obj.car_index
+        i = tile
+        on_tiles, on_obstacles = self._count_wheel_contact(obj, env.road[i], is_obstacle, begin)
+        env.wheels_on_tiles[k] += on_tiles
+        env.wheels_on_obstacles[k] += on_obstacles
+        if begin:
+            env.tile_contact_count[i] += 1
+            # Same rules as FrictionDetector, with per-car visited/contact flags
+            # (a car which is done no longer earns or loses reward)
+            if is_obstacle and not env.tiles_in_contact[k, i]:
+                if not env.dones[k]:
+                    env.rewards[k] -= env.tile_friction[i]
+                env.num_collisions[k] += 1
+            if not env.visited_tiles[k, i]:
+                env.visited_tiles[k, i] = True
+                if not is_obstacle:
+                    if not env.dones[k]:
+                        env.rewards[k] += 1000.0 / len(env.track)
+                    env.tile_visited_count[k] += 1
+            env.tiles_in_contact[k, i] = True
+        else:
+            env.tile_contact_count[i] -= 1
+            env.tiles_in_contact[k, i] = False
+
+class MultiCarRacingObstacles(CarRacingObstacles):
+    """
+    MultiCarRacingObstacles simulates num_cars cars on the same track, in one Box2D world (so the
+    track bodies exist only once). Cars do not collide with each other; each car has its own reward,
+    visited tiles and obstacle collision count.
+
+    step() takes a (num_cars, 3) array of actions, advances all cars with a single world.Step, and returns
+    batched values:
+    - observations: (num_cars, STATE_H, STATE_W, 3) array, each rendered from the point of view of one car
+      (only that car is drawn)
+    - rewards, dones: (num_cars,) arrays. Once a car is done it stays done, its actions are ignored and
+      its rewards are 0 until the next reset().
+    - info: dict of (num_cars,) arrays, with the fields in info_keys (among MULTI_INFO_FIELDS)
+    """
+    def __init__(self, num_cars=4, STATE_W=96, STATE_H=96, verbose=1, render_backend="gl", track_cache=None,
+                 info_keys=DEFAULT_INFO_KEYS):
+        super().__init__(STATE_W=STATE_W, STATE_H=STATE_H, verbose=verbose,
+                         render_backend=render_backend, track_cache=track_cache, info_keys=())
+        self.num_cars = num_cars
+        for key in info_keys:
+            assert key in MULTI_INFO_FIELDS, f"unknown info key {key!r} (available: {list(MULTI_INFO_FIELDS)})"
+        self.info_keys = tuple(info_keys)
+        self.info_fields = [(key, MULTI_INFO_FIELDS[key]) for key in self.info_keys]
+        # Per car: number of wheels touching any tile/an obstacle tile (kept by MultiCarFrictionDetector)
+        self.wheels_on_tiles = np.zeros(num_cars, dtype=np.int64)
+        self.wheels_on_obstacles = np.zeros(num_cars, dtype=np.int64)
+        self.cars = []
+        self.contactListener_keepref = MultiCarFrictionDetector(self)
+        self.world.contactListener = self.contactListener_keepref
+
+        self.action_space = spaces.Box(
+            np.tile(self.action_space.low, (num_cars, 1)),
+            np.tile(self.action_space.high, (num_cars, 1)),
+        )
+        self.observation_space = spaces.Box(
+            low=0, high=255, shape=(num_cars, self.STATE_H, self.STATE_W, 3), dtype=np.uint8
+        )
+
+    def _destroy(self):
+        if not self.road:
+            return
+        super()._destroy()  # destroys the road and self.car (= self.cars[0])
+        for car in self.cars[1:]:
+            car.destroy()
+        self.cars = []
+
+    def _create_car(self):
+        """
+        Creates all cars at the start of the track, and resets the per-car bookkeeping.
+        """
+        self.cars = []
+        for k in range(self.num_cars):
+            car = Car(self.world, *self.track[0][1:4])
+            for body in [car.hull] + car.wheels:
+                for f in body.fixtures:
+                    # Fixtures sharing a negative group index never collide with each other
+                    filter_data = f.filterData
+                    filter_data.groupIndex = -1
+                    f.filterData = filter_data
+            for w in car.wheels:
+                w.car_index = k
+                w.num_obstacle_tiles = 0
+            self.cars.append(car)
+        self.car = self.cars[0]
+
+        self.rewards = np.zeros(self.num_cars)
+        self.prev_rewards = np.zeros(self.num_cars)
+        self.tile_visited_count = np.zeros(self.num_cars, dtype=np.int64)
+        self.num_collisions = np.zeros(self.num_cars, dtype=np.int64)
+        self.visited_tiles = np.zeros((self.num_cars, len(self.road)), dtype=bool)
+        self.tiles_in_contact = np.zeros((self.num_cars, len(self.road)), dtype=bool)
+        self.dones = np.zeros(self.num_cars, dtype=bool)
+        self.wheels_on_tiles[:] = 0
+        self.wheels_on_obstacles[:] = 0
+
+    def background_categories(self):
+        """
+        Returns the (num_cars,) surface categories of the cars (see CarRacingObstacles.background_category()).
+        """
+        background = np.ones(self.num_cars, dtype=np.int64)
+        background[self.wheels_on_obstacles > 0] = 2
+        background[self.wheels_on_tiles == 0] = 0
+        return background
+
+    def _focus(self, k):
+        """
+        Points self.car (and self.reward, shown in the HUD) to car k, for rendering.
+        """
+        self.car = self.cars[k]
+        self.reward = float(self.rewards[k])
+
+    def render_cars(self, mode="state_pixels"):
+        """
+        Renders the view of every car.
+
+        Return:
+            (num_cars, H, W, 3) array
+        """
+        frames = []
+        for k in range(self.num_cars):
+            self._focus(k)
+            frames.append(self.render(mode))
+        self._focus(0)
+        return np.stack(frames)
+
+    def step(self, actions):
+        if actions is not None:
+            for car, action, done in zip(self.cars, actions, self.dones):
+                if done:
+                    action = (0.0, 0.0, 0.0)
+                car.steer(-action[0])
+                car.gas(action[1])
+                car.brake(action[2])
+
+        for car in self.cars:
+            car.step(1.0 / FPS)
+        self.world.Step(1.0 / FPS, 6 * 30, 2 * 30)
+        self.t += 1.0 / FPS
+
+        self.state = self.render_cars("state_pixels")
+
+        step_rewards = np.zeros(self.num_cars)
+        already_done = self.dones.copy()
+        if actions is not None:  # First step without action, called from reset()
+            self.rewards[~self.dones] -= 0.1
+            for car in self.cars:
+                car.fuel_spent = 0.0
+            step_rewards = self.rewards - self.prev_rewards
+            self.prev_rewards = self.rewards.copy()
+            self.dones |= self.tile_visited_count == len(self.track)
+            positions = np.array([utils.get_car_position(car) for car in self.cars])
+            out_of_playfield = np.any(np.abs(positions) > PLAYFIELD, axis=1)
+            step_rewards[out_of_playfield] = -100
+            self.dones |= out_of_playfield
+            step_rewards[already_done] = 0.0
+
+        return self.state, step_rewards, self.dones.copy(), self.get_info()
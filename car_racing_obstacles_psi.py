@@ -1,8 +1,11 @@
 ## Rohan Banerjee
 ## Version of CarRacing-obstacles with modified (Dict) observation space.
 
+import logging
+
 import car_racing_obstacles
 from car_racing_obstacles import CarRacingObstacles
+from utilities.prefetch import EnvSetSampler
 from gym import spaces
 import numpy as np
 
@@ -11,6 +14,8 @@ TRACK_TURN_RATE_MAX = 0.71
 OBSTACLE_PROB_MIN = 0.05
 OBSTACLE_PROB_MAX = 0.13
 
+logger = logging.getLogger(__name__)
+
 class CarRacingObstaclesPsiKP(CarRacingObstacles):
     """
     CarRacingObstaclesPsiKP is a modified version of CarRacingObstacles with modified (Dict) observation space,
@@ -19,25 +24,47 @@ class CarRacingObstaclesPsiKP(CarRacingObstacles):
     The main difference is that each observation from step() is a dictionary with the following keys:
     - 'psi': the environment state (currently, psi = [K,p] = [TRACK_TURN_RATE, OBSTACLE_PROB])
     - 'img': the current image from the environment
+      (with obs_type="rays", the key is 'sensors' and holds the ray-cast sensor vector instead)
 
     Another diference is that the environment parameters K and p are sampled from a set of possible values for each episode.
+
+    With normalize_obs, the image is scaled to [0,1] in obs_dtype (float32 by default, or e.g. float16), using
+    precomputed scalar scale/offset and a preallocated output buffer. The returned 'image' and 'psi' arrays are reused
+    across steps, so copy them if they must outlive the next step()/reset() (e.g. when storing them yourself).
     """
     def __init__(self, verbose=1, normalize_obs=False, turn_rate=TRACK_TURN_RATE_MIN, obstacle_prob=OBSTACLE_PROB_MIN, \
-                 env_set=np.array([[TRACK_TURN_RATE_MIN, OBSTACLE_PROB_MIN]]), env_rng=np.random.default_rng(),STATE_W=64,STATE_H=64):
-        # Call superclass constructor
-        super().__init__(verbose=verbose,STATE_W=STATE_W,STATE_H=STATE_H)
+                 env_set=np.array([[TRACK_TURN_RATE_MIN, OBSTACLE_PROB_MIN]]), env_rng=np.random.default_rng(),STATE_W=64,STATE_H=64,
+                 obs_dtype=np.float32,**kwargs):
+        # Call superclass constructor (kwargs: other CarRacingObstacles options, e.g. frame_skip)
+        super().__init__(verbose=verbose,STATE_W=STATE_W,STATE_H=STATE_H,**kwargs)
         # Create a modified Dict observation space
         # NOTE: Assumes that turn rate and obstacle probability lie in [0,1]
         img_observation_space = self.observation_space
-        self.observation_space = spaces.Dict({"image": img_observation_space, \
-                                              "psi": spaces.Box(low=np.array([0,0]), high=np.array([1,1]), shape=(2,), dtype=np.float32)})
+        self.obs_key = "sensors" if self.obs_type == "rays" else "image"
         # Set the normalization flag
         self.normalize_obs = normalize_obs
-        print(f"Normalizing CarRacingPsiKP observations: {self.normalize_obs}")
+        logger.info("Normalizing CarRacingPsiKP observations: %s", self.normalize_obs)
+        self.obs_buffers = None
+        if self.normalize_obs and self.obs_type == "pixels":
+            # One frame, or a tuple of frames with resolutions (see CarRacingObstacles), all in [0, 255]
+            is_tuple = isinstance(img_observation_space, spaces.Tuple)
+            frame_spaces = img_observation_space.spaces if is_tuple else [img_observation_space]
+            # (obs - low) / (high - low) == obs * scale + offset, with scalar bounds (0 and 255)
+            low = float(np.min(frame_spaces[0].low))
+            high = float(np.max(frame_spaces[0].high))
+            self.obs_scale = 1.0 / (high - low)
+            self.obs_offset = -low * self.obs_scale
+            frame_spaces = [spaces.Box(low=0.0, high=1.0, shape=space.shape, dtype=obs_dtype) for space in frame_spaces]
+            self.obs_buffers = [np.empty(space.shape, dtype=obs_dtype) for space in frame_spaces]
+            img_observation_space = spaces.Tuple(frame_spaces) if is_tuple else frame_spaces[0]
+        self.observation_space = spaces.Dict({self.obs_key: img_observation_space, \
+                                              "psi": spaces.Box(low=np.array([0,0]), high=np.array([1,1]), shape=(2,), dtype=np.float32)})
+        self.psi = np.zeros(2, dtype=np.float32)
         # Set the initial turn rate and obstacle probability
         self.TRACK_TURN_RATE = turn_rate
         self.OBSTACLE_PROB = obstacle_prob
-        print(f"Setting turn rate to: {self.TRACK_TURN_RATE}, obstacle prob to: {self.OBSTACLE_PROB}")
+        self._update_psi()
+        logger.info("Setting turn rate to: %s, obstacle prob to: %s", self.TRACK_TURN_RATE, self.OBSTACLE_PROB)
         # Set the initial environment set (from which we sample environment parameters)
         # Np array of shape (*,2)
         self.env_set = env_set
@@ -45,11 +72,22 @@ class CarRacingObstaclesPsiKP(CarRacingObstacles):
         self.env_rng = env_rng
 
 
+    def seed(self, seed=None):
+        seeds = super().seed(seed)
+        if seed is not None:
+            # [K,p] sampling follows the environment seed too, so that an episode only depends on its seed
+            # (until then, the env_rng given to the constructor is used)
+            self.env_rng = np.random.default_rng(seed)
+        return seeds
+
     def change_env_set(self, env_set):
         """
         Sets the environment set to the given env_set.
         """
         self.env_set = env_set
+        # Prefetched tracks were sampled from the previous set
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
 
     def get_env_set(self):
         """
@@ -57,38 +95,67 @@ class CarRacingObstaclesPsiKP(CarRacingObstacles):
         """
         return self.env_set
 
+    def _update_psi(self):
+        """
+        Writes the (optionally normalized) environment parameters into self.psi (they are constant
+        within an episode, so this is only needed when they change).
+        """
+        track_turn_rate = self.TRACK_TURN_RATE
+        obstacle_prob = self.OBSTACLE_PROB
+        if self.normalize_obs:
+            track_turn_rate = (track_turn_rate - TRACK_TURN_RATE_MIN)/(TRACK_TURN_RATE_MAX-TRACK_TURN_RATE_MIN)
+            obstacle_prob = (obstacle_prob - OBSTACLE_PROB_MIN)/(OBSTACLE_PROB_MAX-OBSTACLE_PROB_MIN)
+        self.psi[0] = track_turn_rate
+        self.psi[1] = obstacle_prob
+
     def reset(self):
         """
         Resamples a new environment from the environment set. Modifies
         the given environment in-place.
         """
-        # Sample a new environment parameter set from the environment set
-        [K,p] = self.env_set[self.env_rng.integers(0, self.env_set.shape[0]),:]
+        if self.prefetcher is not None:
+            # The prefetcher samples [K,p] (with env_rng) along with the track
+            self._take_prefetched_track()
+        else:
+            # Sample a new environment parameter set from the environment set
+            [K,p] = self.env_set[self.env_rng.integers(0, self.env_set.shape[0]),:]
+            self.TRACK_TURN_RATE = K
+            self.OBSTACLE_PROB = p
         # Set the environment parameters
-        print(f"Resetting [K,p] in env.reset() to: {[K,p]}")
-        self.TRACK_TURN_RATE = K
-        self.OBSTACLE_PROB = p
+        logger.debug("Resetting [K,p] in env.reset() to: %s", [self.TRACK_TURN_RATE, self.OBSTACLE_PROB])
+        self._update_psi()
         # Call the superclass reset() method
         return super().reset()
 
+    def prefetch_sampler(self):
+        # Continues from (a copy of) the current state of env_rng
+        return EnvSetSampler(self.env_set, self.env_rng)
+
+    def set_sampler_state(self, state):
+        self.env_rng.bit_generator.state = state
+
     def step(self, action):
         # Call the superclass step() method first, and get return values
         obs, reward, done, info = super().step(action)
-        # Return the environment parameter values as part of the observation
-        track_turn_rate = self.TRACK_TURN_RATE
-        obstacle_prob = self.OBSTACLE_PROB
-        # Optionally normalize the observations
-        if self.normalize_obs:
-            obs = (obs - self.observation_space["image"].low) / (self.observation_space["image"].high - self.observation_space["image"].low)
-            track_turn_rate = (track_turn_rate - TRACK_TURN_RATE_MIN)/(TRACK_TURN_RATE_MAX-TRACK_TURN_RATE_MIN)
-            obstacle_prob = (obstacle_prob - OBSTACLE_PROB_MIN)/(OBSTACLE_PROB_MAX-OBSTACLE_PROB_MIN)
-        obs_dict = {"image": obs, "psi": np.array([track_turn_rate, obstacle_prob])}
+        # Optionally normalize the image(s), in place in the preallocated buffers
+        if self.obs_buffers is not None:
+            is_tuple = isinstance(obs, tuple)
+            for frame, buffer in zip(obs if is_tuple else (obs,), self.obs_buffers):
+                np.multiply(frame, self.obs_scale, out=buffer, casting="unsafe")
+                if self.obs_offset != 0.0:
+                    buffer += self.obs_offset
+            obs = tuple(self.obs_buffers) if is_tuple else self.obs_buffers[0]
+        # Return the environment parameter values (self.psi, see _update_psi()) as part of the observation
+        obs_dict = {self.obs_key: obs, "psi": self.psi}
         # Return the modified observation
         return obs_dict, reward, done, info
 
 if __name__ == "__main__":
     from pyglet.window import key
 
+    # Show the environment's track generation messages
+    logging.basicConfig(level=logging.INFO)
+
     a = np.array([0.0, 0.0, 0.0])
 
     def key_press(k, mod):
@@ -120,9 +187,9 @@ if __name__ == "__main__":
     env.viewer.window.on_key_release = key_release
     record_video = False
     if record_video:
-        from gym.wrappers.monitor import Monitor
+        from utilities.video import AsyncFrameRecorder
 
-        env = Monitor(env, "/tmp/video-test", force=True)
+        env = AsyncFrameRecorder(env, "/tmp/video-test", episode_trigger=lambda episode: True)
     isopen = True
     while isopen:
         env.reset()
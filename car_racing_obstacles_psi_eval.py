@@ -2,10 +2,15 @@
 ## Variant of CarRacing-obstacles-Psi with modified (Dict) observation space,
 ## where environments are chosen from a fixed evaluation set.
 
+import logging
+
 from car_racing_obstacles import CarRacingObstacles
 from gym import spaces
 import numpy as np
 
+from utilities.eval_suite import EvalSuite
+from utilities.prefetch import GridSampler
+
 import random
 random.seed(0)
 TURNRATES=[0.31,0.41,0.51,0.61,0.71]
@@ -16,6 +21,17 @@ TRACK_TURN_RATE_MAX = 0.71
 OBSTACLE_PROB_MIN = 0.05
 OBSTACLE_PROB_MAX = 0.13
 
+# (turn rates, obstacle probs) grid of each mode
+MODE_GRIDS = {
+    "turn_rate": (TURNRATES, [0]),
+    "obs_prob": ([TRACK_TURN_RATE_MIN], PROBS),
+    "both": (TURNRATES, PROBS),
+    "both_default": ([TRACK_TURN_RATE_MIN], [OBSTACLE_PROB_MIN]),
+    "obs_default": ([TRACK_TURN_RATE_MIN], [OBSTACLE_PROB_MIN]),
+}
+
+logger = logging.getLogger(__name__)
+
 class CarRacingObstaclesPsiKPEval(CarRacingObstacles):
     """
     CarRacingObstaclesPsiKPEval is a modified version of CarRacingObstacles with modified (Dict) observation space,
@@ -24,49 +40,82 @@ class CarRacingObstaclesPsiKPEval(CarRacingObstacles):
     The main difference is that each observation from step() is a dictionary with the following keys:
     - 'psi': the environment state (currently, psi = [K,p] = [TRACK_TURN_RATE, OBSTACLE_PROB])
     - 'img': the current image from the environment
+      (with obs_type="rays", the key is 'sensors' and holds the ray-cast sensor vector instead)
 
     Another diference is that the environment parameters K and p are sampled from a set of possible values for each episode.
     Unlike CarRacingObstaclesKP, the environment set is fixed globally and doesn't change within the episode.
 
     Also takes in a flag called mode - one of "turn_rate","obs_prob","both" - indicating which parameter(s) to vary.
+
+    With suite_dir (an evaluation suite written by utilities.eval_suite.build_eval_suite(), e.g. with
+    python -m utilities.eval_suite), reset() instead iterates over the frozen tracks of the mode's suite in a
+    fixed order (cycling), loading their geometry from memory-mapped files without generating anything.
+    shard_index/num_shards split the suite between workers: shard k plays tracks k, k + num_shards, ...
+    seed(n) moves to the n-th track of the shard (modulo its size), so that a seeded episode always plays the
+    same track, whichever episodes were played before it.
     """
-    def __init__(self, seed=0, mode="both", verbose=1):
-        # Call superclass constructor + seeding
-        super().__init__(verbose=verbose)
+    def __init__(self, seed=0, mode="both", verbose=1, suite_dir=None, shard_index=0, num_shards=1, **kwargs):
+        # Call superclass constructor + seeding (kwargs: other CarRacingObstacles options, e.g. frame_skip)
+        super().__init__(verbose=verbose, **kwargs)
         self.seed(seed)
         # Create a modified Dict observation space
         # Assumes that turn rate and obstacle probability lie in [0,1]
         img_observation_space = self.observation_space
-        self.observation_space = spaces.Dict({"image": img_observation_space, \
+        self.obs_key = "sensors" if self.obs_type == "rays" else "image"
+        self.observation_space = spaces.Dict({self.obs_key: img_observation_space, \
                                               "psi": spaces.Box(low=np.array([0,0]), high=np.array([1,1]), shape=(2,), dtype=np.float32)})
         # Set self.turnrates and self.probs (env sampling set) based on mode
         self.mode = mode
+        self.turnrates, self.probs = MODE_GRIDS[self.mode]
         if self.mode == "turn_rate":
-            self.turnrates = TURNRATES
-            self.probs = [0]
-            print("Eval environment: Varying only turn rate. Keeping obstacle prob fixed at 0.")
+            logger.info("Eval environment: Varying only turn rate. Keeping obstacle prob fixed at 0.")
         elif self.mode == "obs_prob":
-            self.turnrates = [TRACK_TURN_RATE_MIN]
-            self.probs = PROBS
-            print(f"Eval environment: Varying only obstacle prob. Keeping turn rate fixed at {TRACK_TURN_RATE_MIN}.")
+            logger.info("Eval environment: Varying only obstacle prob. Keeping turn rate fixed at %s.", TRACK_TURN_RATE_MIN)
         elif self.mode == "both":
-            self.turnrates = TURNRATES
-            self.probs = PROBS
-            print("Eval environment: Varying both turn rate and obstacle prob.")
+            logger.info("Eval environment: Varying both turn rate and obstacle prob.")
         elif self.mode == "both_default" or self.mode == "obs_default":
-            self.turnrates = [TRACK_TURN_RATE_MIN]
-            self.probs = [OBSTACLE_PROB_MIN]
-            print("Eval environment: Keeping both turn rate and obstacle prob. fixed at (0.31,0.05)")
+            logger.info("Eval environment: Keeping both turn rate and obstacle prob. fixed at (0.31,0.05)")
+        # Frozen evaluation suite (None: generate a new track for every episode)
+        self.suite = None
+        if suite_dir is not None:
+            self.suite = EvalSuite(suite_dir, self.mode)
+            self.suite_order = self.suite.shard(shard_index, num_shards)
+            assert len(self.suite_order) > 0, "Empty evaluation suite shard"
+            self.suite_position = int(seed) % len(self.suite_order)
+
+    def seed(self, seed=None):
+        seeds = super().seed(seed)
+        if seed is not None and getattr(self, "suite", None) is not None:
+            self.suite_position = int(seed) % len(self.suite_order)
+        return seeds
+
+    def prefetch_sampler(self):
+        # Continues from (a copy of) the current state of the global random module
+        return GridSampler(self.turnrates, self.probs, random.getstate())
+
+    def set_sampler_state(self, state):
+        random.setstate(state)
 
     def reset(self):
         """
         Resamples a new environment from the environment set. Modifies
         the given environment in-place.
         """
-        # Sample a new environment parameter set from the environment set
-        [K,p] = [random.choice(self.turnrates), random.choice(self.probs)]
+        if self.suite is not None:
+            # Next track of the suite (shard), with its own parameters
+            i = self.suite_order[self.suite_position % len(self.suite_order)]
+            self.suite_position += 1
+            # (_create_track() uses the suite geometry instead of generating a track)
+            K, p, self.pending_geometry = self.suite[i]
+        elif self.prefetcher is not None:
+            # The prefetcher samples [K,p] along with the track
+            self._take_prefetched_track()
+            K, p = self.TRACK_TURN_RATE, self.OBSTACLE_PROB
+        else:
+            # Sample a new environment parameter set from the environment set
+            [K,p] = [random.choice(self.turnrates), random.choice(self.probs)]
         # Set the environment parameters
-        print(f"Eval environment: Resetting [K,p] in env.reset() to: {[K,p]}")
+        logger.debug("Eval environment: Resetting [K,p] in env.reset() to: %s", [K,p])
         self.TRACK_TURN_RATE = K
         self.OBSTACLE_PROB = p
         # Call the superclass reset() method
@@ -78,6 +127,6 @@ class CarRacingObstaclesPsiKPEval(CarRacingObstacles):
         # Return the environment parameter values as part of the observation
         track_turn_rate = self.TRACK_TURN_RATE
         obstacle_prob = self.OBSTACLE_PROB
-        obs_dict = {"image": obs, "psi": np.array([track_turn_rate, obstacle_prob])}
+        obs_dict = {self.obs_key: obs, "psi": np.array([track_turn_rate, obstacle_prob])}
         # Return the modified observation
         return obs_dict, reward, done, info
@@ -16,4 +16,6 @@ if __name__=="__main__":
     # Load evaluation environment
     eval_env = gym.make("CarRacing-v0")
     # Evaluate random policy
-    evaluate_best_model(RandomPolicy(eval_env), eval_env, num_episodes=10)
\ No newline at end of file
+    results = evaluate_best_model(RandomPolicy(eval_env), eval_env, num_episodes=10)
+    print("Episode scores:", results.scores)
+    print(results.summary())
\ No newline at end of file
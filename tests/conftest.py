@@ -0,0 +1,5 @@
+# The modules under test import each other from the repository root (e.g. "from car_racing_obstacles import ...")
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
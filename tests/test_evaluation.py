@@ -0,0 +1,37 @@
+import numpy as np
+from gym.wrappers import TimeLimit
+
+from car_racing_obstacles_psi import CarRacingObstaclesPsiKP
+from utilities.evaluation import evaluate_parallel
+
+ENV_SET = np.array([[0.31, 0.05], [0.51, 0.09], [0.71, 0.13]])
+
+class UniformPolicy:
+    """Random actions from np.random (which seed_episode() seeds)."""
+    def predict(self, obs):
+        return np.random.uniform([-1.0, 0.0, 0.0], [1.0, 1.0, 0.2]).astype(np.float32), None
+
+def make_env():
+    env = CarRacingObstaclesPsiKP(verbose=0, obs_type="none", env_set=ENV_SET)
+    return TimeLimit(env, max_episode_steps=30)
+
+def test_psi_sampling_follows_the_seed():
+    env = make_env()
+    psis = []
+    for seed in [3, 4, 5, 3]:
+        env.seed(seed)
+        env.reset()
+        base = env.unwrapped
+        psis.append((base.TRACK_TURN_RATE, base.OBSTACLE_PROB, len(base.track)))
+    env.close()
+    assert psis[0] == psis[3]
+
+def test_results_do_not_depend_on_num_workers():
+    one = evaluate_parallel(UniformPolicy, make_env, num_episodes=6, num_workers=1, seed=1)
+    three = evaluate_parallel(UniformPolicy, make_env, num_episodes=6, num_workers=3, seed=1)
+    np.testing.assert_array_equal(one.seeds, three.seeds)
+    np.testing.assert_array_equal(one.scores, three.scores)
+    np.testing.assert_array_equal(one.tiles, three.tiles)
+    np.testing.assert_array_equal(one.times, three.times)
+    np.testing.assert_array_equal(one.grass_timesteps, three.grass_timesteps)
+    np.testing.assert_array_equal(one.timesteps, three.timesteps)
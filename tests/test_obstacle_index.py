@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+import pytest
+
+from utilities.utils import ObstacleIndex
+
+def brute_force_nearest(centroids, position):
+    return min((math.dist(c, position) for c in centroids), default=math.inf)
+
+def brute_force_k_nearest(centroids, position, k):
+    ranked = sorted((math.dist(c, position), i) for i, c in enumerate(centroids))[:k]
+    ranked += [(math.inf, -1)] * (k - len(ranked))
+    return [d for d, _ in ranked], [i for _, i in ranked]
+
+def brute_force_ahead(centroids, position, angle):
+    forward = (-math.sin(angle), math.cos(angle))
+    distances = [
+        math.dist(c, position) for c in centroids
+        if (c[0] - position[0]) * forward[0] + (c[1] - position[1]) * forward[1] > 0
+    ]
+    return min(distances, default=math.inf)
+
+@pytest.fixture
+def scene():
+    rng = np.random.default_rng(0)
+    return rng.uniform(-100, 100, size=(12, 2)), rng.uniform(-120, 120, size=(20, 2)), rng.uniform(-np.pi, np.pi, 20)
+
+def test_nearest_distance(scene):
+    centroids, positions, _ = scene
+    index = ObstacleIndex(centroids)
+    expected = [brute_force_nearest(centroids, p) for p in positions]
+    np.testing.assert_allclose(index.nearest_distance(positions), expected)
+    assert index.nearest_distance(positions[0]) == pytest.approx(expected[0])
+
+@pytest.mark.parametrize("k", [1, 3, 12, 15])
+def test_k_nearest(scene, k):
+    centroids, positions, _ = scene
+    index = ObstacleIndex(centroids)
+    distances, indices = index.k_nearest(positions, k)
+    assert distances.shape == indices.shape == (len(positions), k)
+    for p, row_distances, row_indices in zip(positions, distances, indices):
+        expected_distances, expected_indices = brute_force_k_nearest(centroids, p, k)
+        np.testing.assert_allclose(row_distances, expected_distances)
+        np.testing.assert_array_equal(row_indices, expected_indices)
+    single_distances, single_indices = index.k_nearest(positions[0], k)
+    assert single_distances.shape == single_indices.shape == (k,)
+    np.testing.assert_array_equal(single_indices, indices[0])
+
+def test_nearest_ahead_distance(scene):
+    centroids, positions, angles = scene
+    index = ObstacleIndex(centroids)
+    expected = [brute_force_ahead(centroids, p, a) for p, a in zip(positions, angles)]
+    np.testing.assert_allclose(index.nearest_ahead_distance(positions, angles), expected)
+    assert index.nearest_ahead_distance(positions[0], angles[0]) == pytest.approx(expected[0])
+
+def test_forward_vector_is_the_local_y_axis():
+    index = ObstacleIndex([[0.0, 10.0]])
+    # Angle 0 drives towards +y; a quarter turn counter-clockwise drives towards -x
+    assert index.nearest_ahead_distance([0.0, 0.0], 0.0) == pytest.approx(10.0)
+    assert index.nearest_ahead_distance([0.0, 0.0], np.pi) == math.inf
+    assert index.nearest_ahead_distance([5.0, 10.0], np.pi / 2) == pytest.approx(5.0)
+
+def test_no_obstacles():
+    index = ObstacleIndex([])
+    positions = np.zeros((3, 2))
+    assert len(index) == 0
+    np.testing.assert_array_equal(index.nearest_distance(positions), np.inf)
+    assert index.nearest_distance([1.0, 2.0]) == math.inf
+    np.testing.assert_array_equal(index.nearest_ahead_distance(positions, np.zeros(3)), np.inf)
+    distances, indices = index.k_nearest(positions, 2)
+    np.testing.assert_array_equal(distances, np.inf)
+    np.testing.assert_array_equal(indices, -1)
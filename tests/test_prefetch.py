@@ -0,0 +1,37 @@
+import random
+
+import numpy as np
+import pytest
+
+from car_racing_obstacles_psi import CarRacingObstaclesPsiKP
+from car_racing_obstacles_psi_eval import CarRacingObstaclesPsiKPEval
+
+ENV_SET = np.array([[0.31, 0.05], [0.51, 0.09], [0.71, 0.13]])
+
+def make_psi(prefetch):
+    return CarRacingObstaclesPsiKP(verbose=0, obs_type="none", env_set=ENV_SET, prefetch=prefetch)
+
+def make_eval(prefetch):
+    return CarRacingObstaclesPsiKPEval(verbose=0, obs_type="none", prefetch=prefetch)
+
+def episode_sequence(env):
+    """(K, p, track) of a few episodes, with a re-seed in between (which discards the prefetched tracks)."""
+    random.seed(1)
+    env.seed(1)
+    episodes = []
+    for i in range(5):
+        if i == 3:
+            env.seed(9)
+        env.reset()
+        episodes.append((env.TRACK_TURN_RATE, env.OBSTACLE_PROB, np.array(env.track)))
+    env.close()
+    return episodes
+
+@pytest.mark.parametrize("make_env", [make_psi, make_eval], ids=["EnvSetSampler", "GridSampler"])
+def test_prefetched_sequence_matches_synchronous(make_env):
+    synchronous = episode_sequence(make_env(0))
+    prefetched = episode_sequence(make_env(2))
+    assert len(synchronous) == len(prefetched)
+    for (K, p, track), (K_pre, p_pre, track_pre) in zip(synchronous, prefetched):
+        assert (K, p) == (K_pre, p_pre)
+        np.testing.assert_array_equal(track, track_pre)
@@ -0,0 +1,39 @@
+import numpy as np
+
+from car_racing_obstacles import CarRacingObstacles
+from utilities.replay import EpisodeRecord, EpisodeRecorder, ReplayEngine
+
+def record_episode(tmp_path, num_steps=60):
+    env = CarRacingObstacles(verbose=0, obs_type="none")
+    env.OBSTACLE_PROB = 0.13
+    recorder = EpisodeRecorder(env, seed=4, directory=str(tmp_path))
+    rng = np.random.default_rng(0)
+    recorder.reset()
+    rewards = []
+    for _ in range(num_steps):
+        action = rng.uniform([-1.0, 0.5, 0.0], [1.0, 1.0, 0.1])
+        _, reward, done, _ = recorder.step(action)
+        rewards.append(reward)
+        if done:
+            break
+    recorder.close()
+    return recorder.records[-1], np.array(rewards)
+
+def test_replay_matches_the_recording(tmp_path):
+    record, rewards = record_episode(tmp_path)
+    assert len(record) == len(rewards)
+    engine = ReplayEngine()
+    result = engine.replay(record)
+    engine.close()
+    assert result["matches"]
+    np.testing.assert_array_equal(result["rewards"], rewards)
+
+def test_saved_record_replays_identically(tmp_path):
+    record, rewards = record_episode(tmp_path)
+    loaded = EpisodeRecord.load(str(tmp_path / "episode-000000.npz"))
+    np.testing.assert_array_equal(loaded.actions, record.actions)
+    engine = ReplayEngine()
+    result = engine.replay(loaded)
+    engine.close()
+    assert result["matches"]
+    np.testing.assert_array_equal(result["rewards"], rewards)
@@ -0,0 +1,29 @@
+import numpy as np
+
+from utilities.resample import AreaDownsampler, area_weights
+
+def test_weights_rows_sum_to_one():
+    for n_in, n_out in [(8, 4), (96, 64), (600, 96), (7, 7)]:
+        np.testing.assert_allclose(area_weights(n_in, n_out).sum(axis=1), 1.0, rtol=1e-6)
+
+def test_constant_image():
+    # (non-integer factors)
+    downsampler = AreaDownsampler(src_w=96, src_h=72, dst_w=64, dst_h=50)
+    frame = np.full((72, 96, 3), [17, 128, 250], dtype=np.uint8)
+    out = downsampler(frame)
+    assert out.shape == (50, 64, 3) and out.dtype == np.uint8
+    np.testing.assert_array_equal(out, np.broadcast_to([17, 128, 250], out.shape))
+
+def test_block_means():
+    rng = np.random.default_rng(0)
+    # 3x2 blocks (of 3 rows and 2 columns) whose means are integers
+    means = rng.integers(2, 250, size=(4, 5, 3))
+    offsets = np.array([[-2, 2], [-1, 1], [0, 0]])[:, :, None]     # (sums to 0 over a block)
+    frame = np.empty((12, 10, 3), dtype=np.uint8)
+    for i in range(4):
+        for j in range(5):
+            frame[3 * i:3 * i + 3, 2 * j:2 * j + 2] = means[i, j] + offsets
+    expected = frame.reshape(4, 3, 5, 2, 3).astype(np.float64).mean(axis=(1, 3))
+    out = AreaDownsampler(src_w=10, src_h=12, dst_w=5, dst_h=4)(frame)
+    np.testing.assert_array_equal(out, np.rint(expected).astype(np.uint8))
+    np.testing.assert_array_equal(out, expected)
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from utilities.sensors import cast_rays
+
+def test_ray_hits_known_segment():
+    origin = np.array([1.0, 2.0])
+    directions = np.array([[1.0, 0.0], [0.0, 1.0], [-1.0, 0.0], [np.sqrt(0.5), np.sqrt(0.5)]])
+    # Vertical segment x = 6, y in [0, 4], and horizontal segment y = 5, x in [-10, 10]
+    seg_start = np.array([[6.0, 0.0], [-10.0, 5.0]])
+    seg_end = np.array([[6.0, 4.0], [10.0, 5.0]])
+    distances = cast_rays(origin, directions, seg_start, seg_end, max_range=50.0)
+    assert distances[0] == pytest.approx(5.0)
+    assert distances[1] == pytest.approx(3.0)
+    assert distances[2] == 50.0     # (no segment behind the origin)
+    assert distances[3] == pytest.approx(3.0 * np.sqrt(2.0))
+
+def test_ray_capped_at_max_range():
+    distances = cast_rays(np.zeros(2), np.array([[1.0, 0.0]]), np.array([[80.0, -1.0]]), np.array([[80.0, 1.0]]),
+                          max_range=50.0)
+    np.testing.assert_array_equal(distances, [50.0])
+
+def test_no_segments():
+    distances = cast_rays(np.zeros(2), np.array([[1.0, 0.0], [0.0, 1.0]]), np.zeros((0, 2)), np.zeros((0, 2)), 20.0)
+    np.testing.assert_array_equal(distances, [20.0, 20.0])
@@ -0,0 +1,32 @@
+import numpy as np
+
+from utilities.telemetry import EPISODE_DTYPE, TelemetrySink
+
+def episode_values(episode):
+    return (episode, episode, 0.5, 0.1, 300, 4, 0, 200, 10.0 * episode, 1000, 3, 1.5)
+
+def test_in_memory_keeps_the_latest_records():
+    sink = TelemetrySink(capacity=8)
+    for episode in range(5):
+        sink.record_episode(episode_values(episode))
+    np.testing.assert_array_equal(sink.buffered()["episode"], np.arange(5))
+    for episode in range(5, 21):
+        sink.record_episode(episode_values(episode))
+        records = sink.buffered()
+        assert len(records) == min(episode + 1, 8)
+        np.testing.assert_array_equal(records["episode"], np.arange(max(episode - 7, 0), episode + 1))
+    np.testing.assert_array_equal(sink.buffered()["reward"], 10.0 * np.arange(13, 21))
+    sink.close()
+    np.testing.assert_array_equal(sink.buffered()["episode"], np.arange(13, 21))
+
+def test_directory_keeps_every_record(tmp_path):
+    sink = TelemetrySink(str(tmp_path), capacity=8)
+    for episode in range(21):
+        sink.record_episode(episode_values(episode))
+    np.testing.assert_array_equal(sink.buffered()["episode"], np.arange(16, 21))
+    sink.close()
+    assert sink.dropped == 0
+    episodes = TelemetrySink.load(str(tmp_path))
+    np.testing.assert_array_equal(episodes["episode"], np.arange(21))
+    np.testing.assert_array_equal(episodes["seed"], np.arange(21).astype(np.uint64))
+    assert set(episodes) == set(EPISODE_DTYPE.names)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from car_racing_obstacles import CarRacingObstacles
+from utilities.track_cache import TrackCache
+
+def reset_snapshot(cache, seed):
+    """Resets a new environment using cache from seed, and returns its track and generator state."""
+    env = CarRacingObstacles(verbose=0, obs_type="none", track_cache=cache)
+    env.OBSTACLE_PROB = 0.13
+    env.seed(seed)
+    env.reset()
+    snapshot = {
+        "track": np.array(env.track),
+        "road_poly": np.array([vertices for vertices, _ in env.road_poly]),
+        "obstacle_centroids": np.array(env.obstacle_centroids).reshape(-1, 2),
+        "rng_state": env.np_random.get_state(),
+        "generated": env.num_tracks_generated,
+    }
+    env.close()
+    return snapshot
+
+def assert_same_reset(cold, warm):
+    np.testing.assert_array_equal(cold["track"], warm["track"])
+    np.testing.assert_array_equal(cold["road_poly"], warm["road_poly"])
+    np.testing.assert_array_equal(cold["obstacle_centroids"], warm["obstacle_centroids"])
+    np.testing.assert_array_equal(cold["rng_state"][1], warm["rng_state"][1])
+    assert cold["rng_state"][2:] == warm["rng_state"][2:]
+
+def test_memory_hit_reproduces_the_reset():
+    cache = TrackCache()
+    cold = reset_snapshot(cache, 3)
+    warm = reset_snapshot(cache, 3)
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert cold["generated"] == 1 and warm["generated"] == 0
+    assert_same_reset(cold, warm)
+
+def test_disk_hit_reproduces_the_reset(tmp_path):
+    cold = reset_snapshot(TrackCache(str(tmp_path)), 3)
+    # A new cache (empty memory layer) reads the .npz entry
+    cache = TrackCache(str(tmp_path))
+    warm = reset_snapshot(cache, 3)
+    assert (cache.misses, cache.hits) == (0, 1)
+    assert warm["generated"] == 0
+    assert_same_reset(cold, warm)
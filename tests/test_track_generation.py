@@ -0,0 +1,204 @@
+import math
+
+import numpy as np
+import pytest
+
+from car_racing_obstacles import (
+    CarRacingObstacles, BORDER, BORDER_MIN_COUNT, OBSTACLE_COLOR, OBSTACLE_SPACING, ROAD_COLOR,
+    SCALE, TRACK_DETAIL_STEP, TRACK_RAD, TRACK_WIDTH,
+)
+
+def baseline_track(rng, turn_rate, obstacle_prob):
+    """
+    Copy of the original tile-by-tile track generation loops (with the obstacles drawn from rng, like the rest
+    of the track).
+
+    Return:
+        (track, road_poly, obstacle_centroids), or None if the track did not close
+    """
+    CHECKPOINTS = 12
+    checkpoints = []
+    start_alpha = 0.0
+    for c in range(CHECKPOINTS):
+        noise = rng.uniform(0, 2 * math.pi * 1 / CHECKPOINTS)
+        alpha = 2 * math.pi * c / CHECKPOINTS + noise
+        rad = rng.uniform(TRACK_RAD / 3, TRACK_RAD)
+        if c == 0:
+            alpha = 0
+            rad = 1.5 * TRACK_RAD
+        if c == CHECKPOINTS - 1:
+            alpha = 2 * math.pi * c / CHECKPOINTS
+            start_alpha = 2 * math.pi * (-0.5) / CHECKPOINTS
+            rad = 1.5 * TRACK_RAD
+        checkpoints.append((alpha, rad * math.cos(alpha), rad * math.sin(alpha)))
+
+    x, y, beta = 1.5 * TRACK_RAD, 0, 0
+    dest_i = 0
+    laps = 0
+    track = []
+    no_freeze = 2500
+    visited_other_side = False
+    while True:
+        alpha = math.atan2(y, x)
+        if visited_other_side and alpha > 0:
+            laps += 1
+            visited_other_side = False
+        if alpha < 0:
+            visited_other_side = True
+            alpha += 2 * math.pi
+        while True:
+            failed = True
+            while True:
+                dest_alpha, dest_x, dest_y = checkpoints[dest_i % len(checkpoints)]
+                if alpha <= dest_alpha:
+                    failed = False
+                    break
+                dest_i += 1
+                if dest_i % len(checkpoints) == 0:
+                    break
+            if not failed:
+                break
+            alpha -= 2 * math.pi
+        r1x = math.cos(beta)
+        r1y = math.sin(beta)
+        p1x = -r1y
+        p1y = r1x
+        dest_dx = dest_x - x
+        dest_dy = dest_y - y
+        proj = r1x * dest_dx + r1y * dest_dy
+        while beta - alpha > 1.5 * math.pi:
+            beta -= 2 * math.pi
+        while beta - alpha < -1.5 * math.pi:
+            beta += 2 * math.pi
+        prev_beta = beta
+        proj *= SCALE
+        if proj > 0.3:
+            beta -= min(turn_rate, abs(0.001 * proj))
+        if proj < -0.3:
+            beta += min(turn_rate, abs(0.001 * proj))
+        x += p1x * TRACK_DETAIL_STEP
+        y += p1y * TRACK_DETAIL_STEP
+        track.append((alpha, prev_beta * 0.5 + beta * 0.5, x, y))
+        if laps > 4:
+            break
+        no_freeze -= 1
+        if no_freeze == 0:
+            break
+
+    i1, i2 = -1, -1
+    i = len(track)
+    while True:
+        i -= 1
+        if i == 0:
+            return None
+        pass_through_start = track[i][0] > start_alpha and track[i - 1][0] <= start_alpha
+        if pass_through_start and i2 == -1:
+            i2 = i
+        elif pass_through_start and i1 == -1:
+            i1 = i
+            break
+    track = track[i1 : i2 - 1]
+
+    first_beta = track[0][1]
+    well_glued_together = np.sqrt(
+        np.square(math.cos(first_beta) * (track[0][2] - track[-1][2]))
+        + np.square(math.sin(first_beta) * (track[0][3] - track[-1][3]))
+    )
+    if well_glued_together > TRACK_DETAIL_STEP:
+        return None
+
+    border = [False] * len(track)
+    for i in range(len(track)):
+        good = True
+        oneside = 0
+        for neg in range(BORDER_MIN_COUNT):
+            beta1 = track[i - neg - 0][1]
+            beta2 = track[i - neg - 1][1]
+            good &= abs(beta1 - beta2) > turn_rate * 0.2
+            oneside += np.sign(beta1 - beta2)
+        good &= abs(oneside) == BORDER_MIN_COUNT
+        border[i] = good
+    for i in range(len(track)):
+        for neg in range(BORDER_MIN_COUNT):
+            border[i - neg] |= border[i]
+
+    road_poly = []
+    obstacle_centroids = []
+
+    def add_tile(idx, vertices, color):
+        road_poly.append((vertices, np.array(color) + 0.01 * (idx % 3)))
+
+    last_obst_idx = 0
+    for i in range(len(track)):
+        alpha1, beta1, x1, y1 = track[i]
+        alpha2, beta2, x2, y2 = track[i - 1]
+        road1_l = (x1 - TRACK_WIDTH * math.cos(beta1), y1 - TRACK_WIDTH * math.sin(beta1))
+        road1_r = (x1 + TRACK_WIDTH * math.cos(beta1), y1 + TRACK_WIDTH * math.sin(beta1))
+        road2_l = (x2 - TRACK_WIDTH * math.cos(beta2), y2 - TRACK_WIDTH * math.sin(beta2))
+        road2_r = (x2 + TRACK_WIDTH * math.cos(beta2), y2 + TRACK_WIDTH * math.sin(beta2))
+        vertices = [road1_l, road1_r, road2_r, road2_l]
+        if rng.uniform() < obstacle_prob and (i - last_obst_idx) > OBSTACLE_SPACING and not border[i]:
+            last_obst_idx = i
+            road1_mid = (x1, y1)
+            road2_mid = (x2, y2)
+            left_vertices = [road1_l, road1_mid, road2_mid, road2_l]
+            right_vertices = [road1_mid, road1_r, road2_r, road2_mid]
+            if rng.uniform() < 0.5:
+                obst = left_vertices
+                vertices = right_vertices
+            else:
+                obst = right_vertices
+                vertices = left_vertices
+            obstacle_centroids.append(np.mean(np.array(obst), axis=0))
+            add_tile(i, obst, OBSTACLE_COLOR)
+        add_tile(i, vertices, ROAD_COLOR)
+        if border[i]:
+            side = np.sign(beta2 - beta1)
+            b1_l = (x1 + side * TRACK_WIDTH * math.cos(beta1), y1 + side * TRACK_WIDTH * math.sin(beta1))
+            b1_r = (x1 + side * (TRACK_WIDTH + BORDER) * math.cos(beta1),
+                    y1 + side * (TRACK_WIDTH + BORDER) * math.sin(beta1))
+            b2_l = (x2 + side * TRACK_WIDTH * math.cos(beta2), y2 + side * TRACK_WIDTH * math.sin(beta2))
+            b2_r = (x2 + side * (TRACK_WIDTH + BORDER) * math.cos(beta2),
+                    y2 + side * (TRACK_WIDTH + BORDER) * math.sin(beta2))
+            road_poly.append(([b1_l, b1_r, b2_r, b2_l], np.array((1, 1, 1) if i % 2 == 0 else (1, 0, 0), dtype=float)))
+    return track, road_poly, obstacle_centroids
+
+def baseline_reset_track(rng, turn_rate, obstacle_prob):
+    while True:
+        result = baseline_track(rng, turn_rate, obstacle_prob)
+        if result is not None:
+            return result
+
+def _seeded_state(seed):
+    """State of the env's np_random right after env.seed(seed)."""
+    env = CarRacingObstacles(verbose=0, obs_type="none")
+    env.seed(seed)
+    state = env.np_random.get_state()
+    env.close()
+    return state
+
+@pytest.mark.parametrize("seed", [0, 1, 2, 7, 123])
+@pytest.mark.parametrize("turn_rate, obstacle_prob", [(0.31, 0.05), (0.71, 0.13)])
+def test_geometry_matches_baseline_loops(seed, turn_rate, obstacle_prob):
+    env = CarRacingObstacles(verbose=0, obs_type="none")
+    env.TRACK_TURN_RATE = turn_rate
+    env.OBSTACLE_PROB = obstacle_prob
+    env.seed(seed)
+    geometry = env._create_track()
+
+    rng = np.random.RandomState()
+    rng.set_state(_seeded_state(seed))
+    track, road_poly, obstacle_centroids = baseline_reset_track(rng, turn_rate, obstacle_prob)
+
+    np.testing.assert_allclose(geometry["track"], np.array(track), rtol=1e-12, atol=1e-9)
+    assert len(geometry["poly_vertices"]) == len(road_poly)
+    np.testing.assert_allclose(geometry["poly_vertices"], np.array([v for v, _ in road_poly]), rtol=1e-12, atol=1e-9)
+    np.testing.assert_allclose(geometry["poly_colors"], np.array([c for _, c in road_poly]), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(np.asarray(geometry["obstacle_centroids"]).reshape(-1, 2),
+                               np.array(obstacle_centroids).reshape(-1, 2), rtol=1e-12, atol=1e-9)
+
+    # Exactly the same draws are consumed from the generator (so the following tracks match too)
+    state, ref_state = env.np_random.get_state(), rng.get_state()
+    np.testing.assert_array_equal(state[1], ref_state[1])
+    assert state[2:] == ref_state[2:]
+    env.close()
@@ -0,0 +1,58 @@
+import numpy as np
+from gym.wrappers import TimeLimit
+
+from car_racing_obstacles import CarRacingObstacles
+from utilities.vec_env import SharedMemoryVecEnv
+
+EPISODE_STEPS = 3
+ACTION = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+
+def make_env():
+    env = CarRacingObstacles(STATE_W=32, STATE_H=32, verbose=0, render_backend="numpy")
+    return TimeLimit(env, max_episode_steps=EPISODE_STEPS)
+
+def expected_second_reset(seed):
+    """First observation of the second episode of a seeded environment."""
+    env = make_env()
+    env.seed(seed)
+    env.reset()
+    for _ in range(EPISODE_STEPS):
+        env.step(ACTION)
+    obs = env.reset().copy()
+    env.close()
+    return obs
+
+def test_step_after_done_returns_the_reset_observation():
+    vec_env = SharedMemoryVecEnv([make_env, make_env])
+    try:
+        vec_env.seed([5, 6])
+        vec_env.reset()
+        actions = np.stack([ACTION, ACTION])
+        for _ in range(EPISODE_STEPS):
+            _, rewards, dones, _ = vec_env.step(actions)
+        assert dones.all()
+        obs, rewards, dones, infos = vec_env.step(actions)
+        np.testing.assert_array_equal(rewards, 0.0)
+        assert not dones.any()
+        np.testing.assert_array_equal(obs[0], expected_second_reset(5))
+        np.testing.assert_array_equal(obs[1], expected_second_reset(6))
+        assert set(infos) == {"num_obstacles", "num_collisions", "background", "nearest_obs_dist"}
+    finally:
+        vec_env.close()
+
+def test_reset_discards_the_pending_automatic_reset():
+    vec_env = SharedMemoryVecEnv([make_env])
+    try:
+        vec_env.seed([5])
+        vec_env.reset()
+        for _ in range(EPISODE_STEPS):
+            _, _, dones, _ = vec_env.step(ACTION[None])
+        assert dones.all()
+        obs = vec_env.reset()
+        np.testing.assert_array_equal(obs[0], expected_second_reset(5))
+        # A regular step of the new episode (not the first observation of a pending reset)
+        _, rewards, dones, _ = vec_env.step(ACTION[None])
+        assert rewards[0] != 0.0
+        assert not dones.any()
+    finally:
+        vec_env.close()
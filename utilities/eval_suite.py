@@ -0,0 +1,104 @@
+## Frozen evaluation suites for CarRacingObstaclesPsiKPEval: pre-generated tracks, stored as memory-mapped arrays.
+
+import os
+import zlib
+
+import numpy as np
+
+from car_racing_obstacles import CarRacingObstacles
+from utilities.track_cache import GEOMETRY_KEYS
+
+def build_eval_suite(directory, mode_grids, tracks_per_cell=10, seed=0):
+    """
+    Generates a fixed evaluation suite: tracks_per_cell tracks for every (K, p) cell of the grid of each mode,
+    and stores each mode's tracks in directory/<mode>/ (one .npy file per geometry array, all tracks
+    concatenated along the first axis, plus an index.npz with the offsets and the psi/seed of every track).
+
+    Tracks are stored round-robin over the cells (track j of every cell before track j+1 of any cell), so
+    that any prefix of the suite covers the grid evenly.
+
+    Args:
+        directory (str): output directory
+        mode_grids (dict): {mode: (turn rates, obstacle probs)}, e.g. car_racing_obstacles_psi_eval.MODE_GRIDS
+        tracks_per_cell (int): number of tracks (M) per (K, p) cell
+        seed (int): seed of the track seeds
+
+    Return:
+        dict of {mode: number of tracks}
+    """
+    env = CarRacingObstacles(verbose=0, obs_type="none")
+    sizes = {}
+    for mode, (turn_rates, obstacle_probs) in mode_grids.items():
+        cells = [(K, p) for K in turn_rates for p in obstacle_probs]
+        track_seeds = np.random.SeedSequence([seed, zlib.crc32(mode.encode())]).generate_state(
+            tracks_per_cell * len(cells)).astype(np.int64)
+        arrays = {key: [] for key in GEOMETRY_KEYS}
+        psi = []
+        for j in range(tracks_per_cell):
+            for c, (K, p) in enumerate(cells):
+                track_seed = int(track_seeds[j * len(cells) + c])
+                env.seed(track_seed)
+                env.TRACK_TURN_RATE = K
+                env.OBSTACLE_PROB = p
+                geometry = env._create_track()
+                for key in GEOMETRY_KEYS:
+                    arrays[key].append(np.asarray(geometry[key]))
+                psi.append((K, p))
+        _save_suite(os.path.join(directory, mode), arrays, np.array(psi, dtype=np.float64), track_seeds)
+        sizes[mode] = len(psi)
+    env.close()
+    return sizes
+
+def _save_suite(path, arrays, psi, track_seeds):
+    os.makedirs(path, exist_ok=True)
+    index = {"psi": psi, "seed": track_seeds}
+    for key, values in arrays.items():
+        index["offsets_" + key] = np.concatenate([[0], np.cumsum([len(v) for v in values])]).astype(np.int64)
+        np.save(os.path.join(path, key + ".npy"), np.concatenate(values))
+    np.savez(os.path.join(path, "index.npz"), **index)
+
+class EvalSuite:
+    """
+    Read-only view of the tracks of one mode of a suite written by build_eval_suite(). The geometry arrays are
+    memory-mapped, so loading a track costs no generation and only touches the pages of that track.
+    """
+    def __init__(self, directory, mode):
+        path = os.path.join(directory, mode)
+        with np.load(os.path.join(path, "index.npz")) as f:
+            index = {k: f[k] for k in f.files}
+        self.psi = index["psi"]
+        self.seeds = index["seed"]
+        self.offsets = {key: index["offsets_" + key] for key in GEOMETRY_KEYS}
+        self.arrays = {key: np.load(os.path.join(path, key + ".npy"), mmap_mode="r") for key in GEOMETRY_KEYS}
+
+    def __len__(self):
+        return len(self.psi)
+
+    def __getitem__(self, i):
+        """
+        Return:
+            (K, p, geometry dict of track i, as used by CarRacingObstacles._build_track())
+        """
+        geometry = {key: self.arrays[key][self.offsets[key][i]:self.offsets[key][i + 1]] for key in GEOMETRY_KEYS}
+        K, p = self.psi[i]
+        return float(K), float(p), geometry
+
+    def shard(self, shard_index, num_shards):
+        """
+        Returns the indices of the tracks of one shard (every num_shards-th track, from shard_index).
+        """
+        return np.arange(shard_index, len(self), num_shards)
+
+if __name__ == "__main__":
+    import argparse
+    from car_racing_obstacles_psi_eval import MODE_GRIDS
+
+    parser = argparse.ArgumentParser(description="Pre-generates a frozen CarRacingObstaclesPsiKPEval evaluation suite")
+    parser.add_argument("directory", help="output directory")
+    parser.add_argument("--modes", nargs="+", choices=list(MODE_GRIDS), default=list(MODE_GRIDS))
+    parser.add_argument("--tracks-per-cell", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sizes = build_eval_suite(args.directory, {mode: MODE_GRIDS[mode] for mode in args.modes},
+                             args.tracks_per_cell, args.seed)
+    print(f"Evaluation suite written to {args.directory}: {sizes}")
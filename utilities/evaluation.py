@@ -0,0 +1,157 @@
+## Process-parallel policy evaluation on CarRacing(-obstacles) environments, with deterministic per-episode seeds.
+
+import multiprocessing as mp
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from gym.vector.utils import CloudpickleWrapper
+
+import utilities.utils as utils
+
+def episode_seeds(seed, num_episodes):
+    """
+    Returns the seed of every evaluation episode. Episode i always gets the same seed for a given
+    (seed, num_episodes), whichever process runs it.
+    """
+    return np.random.SeedSequence(seed).generate_state(num_episodes).astype(np.int64)
+
+def seed_episode(env, seed):
+    """
+    Seeds everything an episode's outcome depends on: the environment (including the [K,p] sampling of
+    CarRacingObstaclesPsiKP and the suite track of CarRacingObstaclesPsiKPEval, see their seed()), its action
+    space and the global random and np.random generators (used by CarRacingObstaclesPsiKPEval and by some
+    policies), plus torch's generator if torch is loaded (used by stochastic policies).
+    """
+    seed = int(seed)
+    env.seed(seed)
+    env.action_space.seed(seed)
+    np.random.seed(seed)
+    random.seed(seed)
+    if "torch" in sys.modules:
+        sys.modules["torch"].manual_seed(seed)
+
+def run_episode(model, env, seed):
+    """
+    Runs one seeded episode of model on env.
+
+    Return:
+        (score, tiles covered, time taken, timesteps on grass, total timesteps)
+    """
+    seed_episode(env, seed)
+    base = env.unwrapped
+    # CarRacingObstacles keeps the surface under the car incrementally; stock CarRacing needs the wheel scan
+    background_category = getattr(base, "background_category", None)
+    obs = env.reset()
+    done = False
+    score = 0.0
+    grass_timesteps = 0
+    timesteps = 0
+    while not done:
+        on_grass = background_category() == 0 if background_category is not None \
+            else utils.check_if_car_on_grass(base.car)
+        if on_grass:
+            grass_timesteps += 1
+        timesteps += 1
+        action, _ = model.predict(obs)
+        obs, reward, done, _ = env.step(action)
+        score += reward
+    return score, base.tile_visited_count, base.t, grass_timesteps, timesteps
+
+class EvaluationResults:
+    """
+    Per-episode evaluation results (arrays indexed by episode), and their aggregates.
+    """
+    def __init__(self, seeds, episodes):
+        """
+        Args:
+            seeds (np.ndarray): seed of every episode
+            episodes (list): run_episode() result of every episode
+        """
+        self.seeds = np.asarray(seeds)
+        columns = list(zip(*episodes)) if len(episodes) else [()] * 5
+        self.scores = np.array(columns[0], dtype=np.float64)
+        self.tiles = np.array(columns[1], dtype=np.int64)
+        self.times = np.array(columns[2], dtype=np.float64)
+        self.grass_timesteps = np.array(columns[3], dtype=np.int64)
+        self.timesteps = np.array(columns[4], dtype=np.int64)
+
+    @property
+    def num_episodes(self):
+        return len(self.scores)
+
+    @property
+    def mean_score(self):
+        return float(np.mean(self.scores))
+
+    @property
+    def mean_tiles(self):
+        """Average number of tiles covered."""
+        return float(np.mean(self.tiles))
+
+    @property
+    def mean_time(self):
+        """Average time taken."""
+        return float(np.mean(self.times))
+
+    @property
+    def grass_proportion(self):
+        """Proportion of time spent on grass (over all episodes)."""
+        return float(np.sum(self.grass_timesteps) / np.sum(self.timesteps))
+
+    def summary(self):
+        """
+        Return:
+            dict of the aggregated metrics
+        """
+        return {
+            "num_episodes": self.num_episodes,
+            "mean_score": self.mean_score,
+            "std_score": float(np.std(self.scores)),
+            "mean_tiles": self.mean_tiles,
+            "mean_time": self.mean_time,
+            "grass_proportion": self.grass_proportion,
+        }
+
+    def __repr__(self):
+        return f"EvaluationResults({self.summary()})"
+
+# Environment and model of a pool worker (created once per process by _init_worker())
+_worker_env = None
+_worker_model = None
+
+def _init_worker(env_fn, model_fn):
+    global _worker_env, _worker_model
+    _worker_env = env_fn.x()
+    _worker_model = model_fn.x()
+
+def _run_worker_episode(seed):
+    return run_episode(_worker_model, _worker_env, seed)
+
+def evaluate_parallel(model_fn, env_fn, num_episodes=500, num_workers=None, seed=0, context=None):
+    """
+    Evaluates a policy over num_episodes episodes, spread over a pool of processes. Every worker builds its
+    own environment and policy once, with env_fn and model_fn.
+
+    Episode i is seeded with episode_seeds(seed, num_episodes)[i] (see seed_episode()), so the results do not
+    depend on num_workers (as long as the policy is deterministic given those seeds).
+
+    Args:
+        model_fn (callable): returns the policy (an object with predict(obs) -> (action, state), e.g.
+            lambda: stable_baselines3.PPO.load(path))
+        env_fn (callable): returns the evaluation environment
+        num_episodes (int): number of episodes
+        num_workers (int): number of processes (default: os.cpu_count())
+        seed (int): seed of the episode seeds
+        context (str): multiprocessing start method (default: the platform default)
+
+    Return:
+        EvaluationResults
+    """
+    seeds = episode_seeds(seed, num_episodes)
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=mp.get_context(context),
+                             initializer=_init_worker,
+                             initargs=(CloudpickleWrapper(env_fn), CloudpickleWrapper(model_fn))) as pool:
+        episodes = list(pool.map(_run_worker_episode, seeds))
+    return EvaluationResults(seeds, episodes)
@@ -0,0 +1,109 @@
+## Batched OpenGL rendering of the state_pixels observations of several CarRacing-obstacles environments into one offscreen atlas.
+
+import ctypes
+
+import numpy as np
+import pyglet
+from pyglet import gl
+
+from car_racing_obstacles import WINDOW_W, WINDOW_H
+
+class GLAtlasRenderer:
+    """
+    Renders the state_pixels observations of K environments (in the same process) into the tiles of one
+    offscreen framebuffer (tile k is rows [k * STATE_H, (k + 1) * STATE_H)), reads the whole atlas back with a
+    single glReadPixels() call, and returns it as a (K, STATE_H, STATE_W, 3) view of that buffer (no copy).
+
+    One hidden window provides the GL context for all environments (their vertex lists are created in it), so
+    the environments must not also be rendered with render(mode="state_pixels") by the "gl" backend.
+    """
+    def __init__(self, envs):
+        """
+        Args:
+            envs (list): CarRacingObstacles environments (or their psi subclasses), all with the same
+                STATE_W and STATE_H
+        """
+        self.envs = [env.unwrapped for env in envs]
+        self.K = len(self.envs)
+        self.W = self.envs[0].STATE_W
+        self.H = self.envs[0].STATE_H
+        assert self.K > 0
+        assert all(env.STATE_W == self.W and env.STATE_H == self.H for env in self.envs), \
+            "all environments must have the same observation size"
+
+        self.window = pyglet.window.Window(width=WINDOW_W, height=WINDOW_H, visible=False)
+        self.window.switch_to()
+        max_size = gl.GLint()
+        gl.glGetIntegerv(gl.GL_MAX_RENDERBUFFER_SIZE, ctypes.byref(max_size))
+        assert self.W <= max_size.value and self.K * self.H <= max_size.value, \
+            f"an atlas of {self.K} tiles of {self.W}x{self.H} exceeds GL_MAX_RENDERBUFFER_SIZE ({max_size.value})"
+
+        self.framebuffer = gl.GLuint()
+        self.renderbuffer = gl.GLuint()
+        gl.glGenFramebuffers(1, ctypes.byref(self.framebuffer))
+        gl.glGenRenderbuffers(1, ctypes.byref(self.renderbuffer))
+        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, self.renderbuffer)
+        gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_RGB8, self.W, self.K * self.H)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+        gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0, gl.GL_RENDERBUFFER,
+                                     self.renderbuffer)
+        status = gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        assert status == gl.GL_FRAMEBUFFER_COMPLETE, f"incomplete atlas framebuffer (status {status:#x})"
+
+        self.buffer = np.empty((self.K * self.H, self.W, 3), dtype=np.uint8)
+        self.frames = self.buffer.reshape(self.K, self.H, self.W, 3)
+
+    def render(self, indices=None):
+        """
+        Renders the current state of the environments (the ones not reset yet are left black).
+
+        Args:
+            indices (iterable): environments to draw (default: all); the tiles of the others keep their
+                previous contents
+
+        Return:
+            (K, STATE_H, STATE_W, 3) uint8 array of the frames (a view of a buffer reused by the next call)
+        """
+        self.window.switch_to()
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+        gl.glMatrixMode(gl.GL_PROJECTION)
+        gl.glPushMatrix()
+        gl.glLoadIdentity()
+        # Upside down, so that the bottom-up glReadPixels() rows of every tile come out top-down
+        gl.glOrtho(0, WINDOW_W, WINDOW_H, 0, -1, 1)
+        gl.glMatrixMode(gl.GL_MODELVIEW)
+        gl.glEnable(gl.GL_SCISSOR_TEST)
+        for k in range(self.K) if indices is None else indices:
+            env = self.envs[k]
+            gl.glViewport(0, k * self.H, self.W, self.H)
+            gl.glScissor(0, k * self.H, self.W, self.H)
+            gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+            if "t" in env.__dict__:
+                env._draw_state_gl()
+        gl.glDisable(gl.GL_SCISSOR_TEST)
+        gl.glMatrixMode(gl.GL_PROJECTION)
+        gl.glPopMatrix()
+        gl.glMatrixMode(gl.GL_MODELVIEW)
+
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        gl.glReadPixels(
+            0, 0, self.W, self.K * self.H, gl.GL_RGB, gl.GL_UNSIGNED_BYTE,
+            self.buffer.ctypes.data_as(ctypes.POINTER(gl.GLubyte))
+        )
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        return self.frames
+
+    def close(self):
+        if self.window is None:
+            return
+        self.window.switch_to()
+        gl.glDeleteFramebuffers(1, ctypes.byref(self.framebuffer))
+        gl.glDeleteRenderbuffers(1, ctypes.byref(self.renderbuffer))
+        self.window.close()
+        self.window = None
+        for env in self.envs:
+            # Their vertex lists belonged to the atlas context
+            env.grass_vertex_list = None
+            env.road_vertex_list = None
+            env.indicator_vertex_list = None
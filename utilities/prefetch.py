@@ -0,0 +1,165 @@
+## Background pre-generation of CarRacing-obstacles tracks (in a thread or a helper process).
+
+import copy
+import multiprocessing as mp
+import queue
+import random
+import threading
+
+# Track parameter samplers draw from their own copy of the environment's generator (so that tracks which are
+# prefetched but never used do not advance it); get_state() is the state of that copy after the last draw,
+# which the environment restores into its generator when it takes the track (see set_sampler_state()).
+
+class FixedPsi:
+    """
+    Track parameter sampler always returning the same (TRACK_TURN_RATE, OBSTACLE_PROB).
+    """
+    def __init__(self, turn_rate, obstacle_prob):
+        self.psi = (float(turn_rate), float(obstacle_prob))
+
+    def __call__(self):
+        return self.psi
+
+    def __eq__(self, other):
+        return isinstance(other, FixedPsi) and self.psi == other.psi
+
+    def get_state(self):
+        return None
+
+class EnvSetSampler:
+    """
+    Track parameter sampler drawing a row of env_set with a copy of the np.random.Generator rng (as
+    CarRacingObstaclesPsiKP.reset() does with rng itself).
+    """
+    def __init__(self, env_set, rng):
+        self.env_set = env_set
+        self.rng = copy.deepcopy(rng)
+
+    def __call__(self):
+        K, p = self.env_set[self.rng.integers(0, self.env_set.shape[0]), :]
+        return float(K), float(p)
+
+    def get_state(self):
+        return self.rng.bit_generator.state
+
+class GridSampler:
+    """
+    Track parameter sampler choosing K and p independently with a random.Random (as
+    CarRacingObstaclesPsiKPEval.reset() does with the global random module).
+    """
+    def __init__(self, turn_rates, obstacle_probs, rng_state):
+        self.turn_rates = turn_rates
+        self.obstacle_probs = obstacle_probs
+        self.rng = random.Random()
+        self.rng.setstate(rng_state)
+
+    def __call__(self):
+        return self.rng.choice(self.turn_rates), self.rng.choice(self.obstacle_probs)
+
+    def get_state(self):
+        return self.rng.getstate()
+
+def _produce(sampler, rng_state, out_queue, stop):
+    """
+    Generates tracks one after the other into out_queue (blocking while it is full), until stop is set.
+
+    Each item is (K, p, geometry, generator state after generation, number of retries, sampler state after
+    drawing K and p). Track i is generated from the generator state left by track i - 1, starting from
+    rng_state, exactly as consecutive reset() calls of the environment would.
+    """
+    from car_racing_obstacles import CarRacingObstacles
+    generator = CarRacingObstacles(verbose=0, obs_type="none")
+    generator.np_random.set_state(rng_state)
+    try:
+        while not stop.is_set():
+            K, p = sampler()
+            generator.TRACK_TURN_RATE = K
+            generator.OBSTACLE_PROB = p
+            retries = generator.num_track_retries
+            geometry = generator._create_track()
+            item = (K, p, geometry, generator.np_random.get_state(), generator.num_track_retries - retries,
+                    sampler.get_state())
+            while not stop.is_set():
+                try:
+                    out_queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+    finally:
+        generator.close()
+
+class TrackPrefetcher:
+    """
+    Generates the tracks of the next episodes ahead of time, in a background thread (default) or a helper
+    process (which also runs in parallel with the environment's own Python code), into a queue of at most
+    depth tracks.
+
+    The producer has its own copy of the environment's random number generator state (and its own parameter
+    sampler, with a copy of the generator the parameters are drawn from). Every track comes with the states
+    of both generators after it, which the environment restores when it takes the track, so the sequence of
+    tracks is the same as without prefetching (tracks generated but discarded do not advance them);
+    restart() must be called, from the environment's current states, whenever they are changed from outside
+    (e.g. by seed()).
+    """
+    def __init__(self, depth=2, use_process=False):
+        """
+        Args:
+            depth (int): maximum number of tracks generated in advance
+            use_process (bool): generate in a helper process instead of a thread
+        """
+        assert depth >= 1
+        self.depth = depth
+        self.use_process = use_process
+        self.sampler = None
+        self.worker = None
+
+    def restart(self, rng_state, sampler):
+        """
+        Discards the tracks generated so far and starts generating from rng_state (the state of the
+        environment's np_random), with the track parameters drawn from sampler.
+        """
+        self.stop()
+        self.sampler = sampler
+        if self.use_process:
+            ctx = mp.get_context()
+            self.queue = ctx.Queue(maxsize=self.depth)
+            self.stop_event = ctx.Event()
+            self.worker = ctx.Process(target=_produce, args=(sampler, rng_state, self.queue, self.stop_event),
+                                      name="TrackPrefetcher", daemon=True)
+        else:
+            self.queue = queue.Queue(maxsize=self.depth)
+            self.stop_event = threading.Event()
+            self.worker = threading.Thread(target=_produce, args=(sampler, rng_state, self.queue, self.stop_event),
+                                           name="TrackPrefetcher", daemon=True)
+        self.worker.start()
+
+    def get(self):
+        """
+        Returns the next generated track, as (K, p, geometry, generator state after generation, number of
+        retries, sampler state), waiting for it if it is not ready yet.
+        """
+        while True:
+            try:
+                return self.queue.get(timeout=1.0)
+            except queue.Empty:
+                if not self.worker.is_alive():
+                    raise RuntimeError("The track prefetcher stopped unexpectedly")
+
+    def stop(self):
+        """
+        Stops the producer (if any).
+        """
+        if self.worker is None:
+            return
+        self.stop_event.set()
+        # Drain the queue, so that a producer blocked on it (or on flushing it to the pipe) can exit
+        while self.worker.is_alive():
+            try:
+                self.queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self.worker.join()
+        self.worker = None
+
+    def close(self):
+        self.stop()
@@ -0,0 +1,105 @@
+## Low-overhead per-phase timing of CarRacing-obstacles step() and reset().
+
+from time import perf_counter_ns
+
+import numpy as np
+
+# Latencies are histogrammed in power-of-two nanosecond buckets: bucket b holds [2^(b-1), 2^b) ns
+NUM_BUCKETS = 48
+
+class PhaseProfiler:
+    """
+    Per-phase call counters, total times and latency histograms.
+
+    Instrumented code reads the clock itself, only when a profiler is set, and hands the start time of a
+    phase to record(), which returns the current time (so that consecutive phases can be chained):
+
+        if profiler is not None:
+            t = perf_counter_ns()
+        car.step(dt)
+        if profiler is not None:
+            t = profiler.record("car_step", t)
+
+    so that a disabled profiler (None) costs one comparison per phase.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Clears all counters and histograms.
+        """
+        self.counts = {}
+        self.total_ns = {}
+        self.histograms = {}
+        self.events = {}
+        # Duration (ns) of the last occurrence of every phase
+        self.last_ns = {}
+
+    def record(self, phase, start_ns):
+        """
+        Records one occurrence of phase, which started at start_ns (perf_counter_ns()).
+
+        Return:
+            the current perf_counter_ns()
+        """
+        now = perf_counter_ns()
+        duration = now - start_ns
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = self.histograms[phase] = [0] * NUM_BUCKETS
+            self.counts[phase] = 0
+            self.total_ns[phase] = 0
+        histogram[min(duration.bit_length(), NUM_BUCKETS - 1)] += 1
+        self.counts[phase] += 1
+        self.total_ns[phase] += duration
+        self.last_ns[phase] = duration
+        return now
+
+    def count(self, event, n=1):
+        """
+        Counts an event without a duration (e.g. a track generation retry).
+        """
+        self.events[event] = self.events.get(event, 0) + n
+
+    def histogram(self, phase):
+        """
+        Return:
+            (bucket upper edges in ns, counts) arrays of the latency histogram of phase
+        """
+        return 2.0 ** np.arange(NUM_BUCKETS), np.array(self.histograms[phase], dtype=np.int64)
+
+    def percentile(self, phase, q):
+        """
+        Returns the q-th percentile latency (in ns) of phase, as the upper edge of the histogram bucket it falls in
+        (i.e. within a factor of 2).
+        """
+        edges, counts = self.histogram(phase)
+        cumulative = np.cumsum(counts)
+        return float(edges[np.searchsorted(cumulative, q / 100.0 * cumulative[-1])])
+
+    def last_ms(self):
+        """
+        Return:
+            dict of the duration (in ms) of the last occurrence of every phase
+        """
+        return {phase: duration / 1e6 for phase, duration in self.last_ns.items()}
+
+    def summary(self):
+        """
+        Return:
+            dict of {phase: {count, total_ms, mean_us, p50_us, p95_us, p99_us}}, plus the event counters
+            under "events"
+        """
+        summary = {}
+        for phase, count in self.counts.items():
+            summary[phase] = {
+                "count": count,
+                "total_ms": self.total_ns[phase] / 1e6,
+                "mean_us": self.total_ns[phase] / count / 1e3,
+                "p50_us": self.percentile(phase, 50) / 1e3,
+                "p95_us": self.percentile(phase, 95) / 1e3,
+                "p99_us": self.percentile(phase, 99) / 1e3,
+            }
+        summary["events"] = dict(self.events)
+        return summary
@@ -0,0 +1,172 @@
+## Headless NumPy rasterizer for CarRacing "state_pixels" observations (no pyglet/OpenGL required).
+
+import numpy as np
+
+# Labels of the static (non-tile) entries of the palette
+LABEL_GRASS = 0
+LABEL_GRASS_LIGHT = 1
+LABEL_OUTSIDE = 2
+NUM_STATIC_LABELS = 3
+
+GRASS_COLOR = [0.4, 0.8, 0.4]
+GRASS_LIGHT_COLOR = [0.4, 0.9, 0.4]
+OUTSIDE_COLOR = [0.0, 0.0, 0.0]     # GL clear color beyond the playfield
+
+def to_uint8_colors(colors):
+    """
+    Converts float RGB(A) colors in [0,1] to uint8 RGB, the same way the GL framebuffer does.
+
+    Args:
+        colors (array-like): (..., 3) or (..., 4) float colors
+
+    Return:
+        (..., 3) uint8 array
+    """
+    colors = np.asarray(colors, dtype=np.float64)[..., :3]
+    return np.clip(np.round(colors * 255.0), 0, 255).astype(np.uint8)
+
+def fill_convex_polygon(target, vertices, value):
+    """
+    Fills a convex polygon into target (in-place). A pixel is filled if its centre lies inside the polygon.
+
+    Args:
+        target (np.ndarray): (H, W) or (H, W, C) array
+        vertices (array-like): (N, 2) polygon vertices in (column, row) pixel coordinates
+        value: value (scalar or length-C array) written to the covered pixels
+    """
+    v = np.asarray(vertices, dtype=np.float64)
+    h, w = target.shape[:2]
+    c0 = max(int(np.floor(v[:, 0].min())), 0)
+    c1 = min(int(np.ceil(v[:, 0].max())), w)
+    r0 = max(int(np.floor(v[:, 1].min())), 0)
+    r1 = min(int(np.ceil(v[:, 1].max())), h)
+    if c0 >= c1 or r0 >= r1:
+        return
+    cols = np.arange(c0, c1) + 0.5
+    rows = np.arange(r0, r1)[:, None] + 0.5
+    inside_pos = np.ones((r1 - r0, c1 - c0), dtype=bool)
+    inside_neg = np.ones((r1 - r0, c1 - c0), dtype=bool)
+    # Accept either winding order: the centre must be on the same side of every edge
+    for (x1, y1), (x2, y2) in zip(v, np.roll(v, -1, axis=0)):
+        cross = (x2 - x1) * (rows - y1) - (y2 - y1) * (cols - x1)
+        inside_pos &= cross >= 0
+        inside_neg &= cross <= 0
+    target[r0:r1, c0:c1][inside_pos | inside_neg] = value
+
+class TrackRasterizer:
+    """
+    Renders the ego-centric "state_pixels" view of a CarRacing track without OpenGL.
+
+    The grass grid and all road/obstacle/border polygons are rasterized once per track (set_track())
+    into a world-space label image, where each pixel stores the index of the polygon covering it.
+    Every frame, render() warps that label image into the camera frame with a vectorized
+    (nearest-neighbour) affine transform, looks the labels up in a palette of the current tile colors
+    (so visited tiles change color exactly like in the GL path) and draws the car and HUD on top.
+    """
+    def __init__(self, width, height, window_w, window_h, playfield, pixels_per_unit, grass_cells=20):
+        """
+        Args:
+            width, height (int): size of the rendered observation (STATE_W, STATE_H)
+            window_w, window_h (int): size of the (virtual) window the GL path projects onto the viewport
+            playfield (float): half-extent of the playfield in world units
+            pixels_per_unit (float): resolution of the pre-rasterized track image
+            grass_cells (int): number of grass grid cells on each side of the origin
+        """
+        self.width = width
+        self.height = height
+        self.window_w = window_w
+        self.window_h = window_h
+        self.playfield = playfield
+        self.pixels_per_unit = pixels_per_unit
+        self.grass_cells = grass_cells
+        self.track_size = int(np.ceil(2 * playfield * pixels_per_unit))
+
+        # Window-space offsets (relative to the camera anchor at (W/2, H/4)) of every output pixel centre.
+        # Output row 0 is the top of the image, as in the flipped GL readback.
+        cols = (np.arange(width) + 0.5) * window_w / width
+        rows = (height - np.arange(height) - 0.5) * window_h / height
+        self._dx = np.broadcast_to(cols[None, :] - window_w / 2, (height, width)).copy()
+        self._dy = np.broadcast_to(rows[:, None] - window_h / 4, (height, width)).copy()
+
+        self._static_palette = to_uint8_colors([GRASS_COLOR, GRASS_LIGHT_COLOR, OUTSIDE_COLOR])
+        self._grass_labels = self._rasterize_grass()
+        self.labels = None
+
+    def _rasterize_grass(self):
+        """Rasterizes the checkerboard grass grid drawn by CarRacingObstacles.render_road()."""
+        k = self.playfield / self.grass_cells
+        centres = (np.arange(self.track_size) + 0.5) / self.pixels_per_unit - self.playfield
+        light = np.floor(centres / k).astype(np.int64) % 2 == 0
+        return np.where(light[:, None] & light[None, :], LABEL_GRASS_LIGHT, LABEL_GRASS).astype(np.int16)
+
+    def set_track(self, road_poly):
+        """
+        Pre-rasterizes the track polygons (called once per reset()).
+
+        Args:
+            road_poly (list): list of (vertices, color) tuples, in drawing order
+        """
+        labels = self._grass_labels.copy()
+        for i, (poly, _) in enumerate(road_poly):
+            pixels = (np.asarray(poly, dtype=np.float64) + self.playfield) * self.pixels_per_unit
+            fill_convex_polygon(labels, pixels, NUM_STATIC_LABELS + i)
+        self.labels = labels
+
+    def world_to_pixels(self, points, zoom, scroll_x, scroll_y, angle):
+        """Maps (N, 2) world points to (column, row) output pixel coordinates."""
+        points = np.asarray(points, dtype=np.float64)
+        c, s = np.cos(angle), np.sin(angle)
+        rx = points[:, 0] - scroll_x
+        ry = points[:, 1] - scroll_y
+        wx = self.window_w / 2 + zoom * (c * rx - s * ry)
+        wy = self.window_h / 4 + zoom * (s * rx + c * ry)
+        return self.window_to_pixels(np.stack([wx, wy], axis=1))
+
+    def window_to_pixels(self, points):
+        """Maps (N, 2) window points to (column, row) output pixel coordinates."""
+        points = np.asarray(points, dtype=np.float64)
+        return np.stack([points[:, 0] * self.width / self.window_w,
+                         self.height - points[:, 1] * self.height / self.window_h], axis=1)
+
+    def render(self, camera, tile_colors, world_polygons=(), hud_quads=None, hud_colors=None, out=None):
+        """
+        Renders one observation.
+
+        Args:
+            camera (tuple): (zoom, scroll_x, scroll_y, angle), as computed by CarRacingObstacles._camera()
+            tile_colors (array-like): (N, 3) current colors of the polygons passed to set_track()
+            world_polygons (list): (vertices, color) polygons in world coordinates drawn over the track (the car)
+            hud_quads (np.ndarray): (M, 4, 2) HUD quads in window coordinates
+            hud_colors (np.ndarray): (M, 3) HUD quad colors
+            out (np.ndarray): optional (height, width, 3) uint8 array to render into
+
+        Return:
+            (height, width, 3) uint8 array (out, if given)
+        """
+        zoom, scroll_x, scroll_y, angle = camera
+        c, s = np.cos(angle), np.sin(angle)
+        # Inverse camera transform: world = scroll + R(-angle) * (window - anchor) / zoom
+        x = scroll_x + (c * self._dx + s * self._dy) / zoom
+        y = scroll_y + (c * self._dy - s * self._dx) / zoom
+        col = np.floor((x + self.playfield) * self.pixels_per_unit).astype(np.int64)
+        row = np.floor((y + self.playfield) * self.pixels_per_unit).astype(np.int64)
+        valid = (col >= 0) & (col < self.track_size) & (row >= 0) & (row < self.track_size)
+        np.clip(col, 0, self.track_size - 1, out=col)
+        np.clip(row, 0, self.track_size - 1, out=row)
+        labels = np.where(valid, self.labels[row, col], LABEL_OUTSIDE)
+
+        palette = self._static_palette
+        if len(tile_colors):
+            palette = np.concatenate([palette, to_uint8_colors(tile_colors)])
+        if out is None:
+            img = palette[labels]
+        else:
+            img = np.take(palette, labels, axis=0, out=out)
+
+        for poly, color in world_polygons:
+            fill_convex_polygon(img, self.world_to_pixels(poly, zoom, scroll_x, scroll_y, angle),
+                                to_uint8_colors(color))
+        if hud_quads is not None:
+            for quad, color in zip(hud_quads, to_uint8_colors(hud_colors)):
+                fill_convex_polygon(img, self.window_to_pixels(quad), color)
+        return img
@@ -0,0 +1,177 @@
+## Compact episode recording (seed, psi and actions) and headless re-simulation of CarRacing-obstacles episodes.
+
+import os
+
+import gym
+import numpy as np
+
+from car_racing_obstacles import CarRacingObstacles
+
+def episode_seed(seed, episode):
+    """
+    Returns the environment seed of episode number episode of a recording started with seed.
+    """
+    return int(np.random.SeedSequence([seed, episode]).generate_state(1)[0])
+
+class EpisodeRecord:
+    """
+    Everything needed to re-simulate an episode exactly: the environment seed it was reset with, the track
+    parameters psi = (TRACK_TURN_RATE, OBSTACLE_PROB), frame_skip and the action sequence, plus the episode's
+    total reward and number of collisions (to check a replay against).
+    """
+    def __init__(self, seed, turn_rate, obstacle_prob, actions, frame_skip=1, total_reward=np.nan, num_collisions=-1):
+        self.seed = int(seed)
+        self.turn_rate = float(turn_rate)
+        self.obstacle_prob = float(obstacle_prob)
+        # (float64, so that actions given as float64 are replayed bit for bit)
+        self.actions = np.asarray(actions, dtype=np.float64).reshape(-1, 3)
+        self.frame_skip = int(frame_skip)
+        self.total_reward = float(total_reward)
+        self.num_collisions = int(num_collisions)
+
+    def __len__(self):
+        return len(self.actions)
+
+    def save(self, path):
+        """
+        Saves the record as an (uncompressed) .npz file.
+        """
+        np.savez(path, seed=self.seed, turn_rate=self.turn_rate, obstacle_prob=self.obstacle_prob,
+                 actions=self.actions, frame_skip=self.frame_skip, total_reward=self.total_reward,
+                 num_collisions=self.num_collisions)
+
+    @staticmethod
+    def load(path):
+        with np.load(path) as f:
+            return EpisodeRecord(int(f["seed"]), float(f["turn_rate"]), float(f["obstacle_prob"]), f["actions"],
+                                 int(f["frame_skip"]), float(f["total_reward"]), int(f["num_collisions"]))
+
+class EpisodeRecorder(gym.Wrapper):
+    """
+    Records every episode of a CarRacingObstacles environment (or of its psi subclasses) as an EpisodeRecord.
+
+    To make every episode reproducible on its own, each reset() first re-seeds the environment with
+    episode_seed(seed, episode) (the track and the obstacles only depend on that seed and on psi).
+    Finished records are kept in self.records (the last max_records ones) and, if directory is given,
+    saved there as episode-<n>.npz.
+    """
+    def __init__(self, env, seed=0, directory=None, max_records=1000):
+        super().__init__(env)
+        self.base_seed = seed
+        self.directory = directory
+        self.max_records = max_records
+        self.records = []
+        self.episode = -1
+        self.actions = []
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def reset(self, **kwargs):
+        self._finish_episode()
+        self.episode += 1
+        self.env.seed(episode_seed(self.base_seed, self.episode))
+        return self.env.reset(**kwargs)
+
+    def step(self, action):
+        self.actions.append(np.array(action, dtype=np.float64))
+        obs, reward, done, info = self.env.step(action)
+        if done:
+            self._finish_episode()
+        return obs, reward, done, info
+
+    def close(self):
+        self._finish_episode()
+        return self.env.close()
+
+    def _finish_episode(self):
+        if not self.actions:
+            return
+        base = self.env.unwrapped
+        record = EpisodeRecord(
+            episode_seed(self.base_seed, self.episode), base.TRACK_TURN_RATE, base.OBSTACLE_PROB,
+            np.stack(self.actions), base.frame_skip, base.reward, base.num_collisions,
+        )
+        self.actions = []
+        self.records.append(record)
+        del self.records[:-self.max_records]
+        if self.directory is not None:
+            record.save(os.path.join(self.directory, f"episode-{self.episode:06d}.npz"))
+
+class ReplayEngine:
+    """
+    Re-simulates recorded episodes headlessly (obs_type="none": nothing is rendered unless asked for) and
+    optionally renders selected frames, at any observation size.
+
+    Replays are exact as long as the recording environment did not use reuse_car (see CarRacingObstacles).
+    """
+    def __init__(self, render_backend="numpy"):
+        """
+        Args:
+            render_backend (str): backend of the rendered frames ("numpy" needs no display)
+        """
+        self.render_backend = render_backend
+        # One environment per (STATE_W, STATE_H, frame_skip)
+        self.envs = {}
+
+    def _env(self, STATE_W, STATE_H, frame_skip):
+        key = (STATE_W, STATE_H, frame_skip)
+        if key not in self.envs:
+            self.envs[key] = CarRacingObstacles(STATE_W=STATE_W, STATE_H=STATE_H, verbose=0, obs_type="none",
+                                                render_backend=self.render_backend, frame_skip=frame_skip)
+        return self.envs[key]
+
+    def replay(self, record, render_steps=(), STATE_W=96, STATE_H=96):
+        """
+        Re-simulates an episode.
+
+        Args:
+            record (EpisodeRecord): episode to replay
+            render_steps (iterable): steps whose state_pixels frame is rendered (step k is the state after the
+                first k actions, so 0 is the first observation of the episode)
+            STATE_W, STATE_H (int): size of the rendered frames
+
+        Return:
+            dict with
+            - 'rewards', 'num_collisions', 'background', 'nearest_obs_dist': (T,) arrays, for every action
+            - 'frames': dict of {step: (STATE_H, STATE_W, 3) frame}
+            - 'total_reward' and 'matches' (whether the total reward and collisions match the record)
+        """
+        env = self._env(STATE_W, STATE_H, record.frame_skip)
+        render_steps = set(render_steps)
+        env.TRACK_TURN_RATE = record.turn_rate
+        env.OBSTACLE_PROB = record.obstacle_prob
+        env.seed(record.seed)
+        env.reset()
+        frames = {}
+        if 0 in render_steps:
+            frames[0] = env.get_observation().copy()
+
+        num_steps = len(record)
+        rewards = np.zeros(num_steps)
+        num_collisions = np.zeros(num_steps, dtype=np.int64)
+        background = np.zeros(num_steps, dtype=np.int64)
+        nearest_obs_dist = np.zeros(num_steps)
+        for k, action in enumerate(record.actions):
+            _, rewards[k], done, info = env.step(action)
+            num_collisions[k] = info["num_collisions"]
+            background[k] = info["background"]
+            nearest_obs_dist[k] = info["nearest_obs_dist"]
+            if k + 1 in render_steps:
+                frames[k + 1] = env.get_observation().copy()
+            if done:
+                break
+        matches = bool(np.isclose(env.reward, record.total_reward)) and env.num_collisions == record.num_collisions
+        return {
+            "rewards": rewards,
+            "num_collisions": num_collisions,
+            "background": background,
+            "nearest_obs_dist": nearest_obs_dist,
+            "frames": frames,
+            "total_reward": env.reward,
+            "matches": matches,
+        }
+
+    def close(self):
+        for env in self.envs.values():
+            env.close()
+        self.envs = {}
@@ -0,0 +1,42 @@
+## Vectorized area-averaging downsampling of rendered frames into preallocated buffers.
+
+import numpy as np
+
+def area_weights(n_in, n_out):
+    """
+    Returns the (n_out, n_in) matrix averaging, for every output pixel, the input pixels it covers
+    (weighted by their overlap, so that non-integer factors are handled exactly).
+    """
+    scale = n_in / n_out
+    left = np.arange(n_out)[:, None] * scale
+    right = left + scale
+    pixels = np.arange(n_in)[None, :]
+    overlap = np.clip(np.minimum(right, pixels + 1) - np.maximum(left, pixels), 0, None)
+    return (overlap / scale).astype(np.float32)
+
+class AreaDownsampler:
+    """
+    Downsamples (src_h, src_w, 3) uint8 frames to (dst_h, dst_w, 3) by area averaging, as two matrix products
+    (rows, then columns) into buffers allocated once.
+    """
+    def __init__(self, src_w, src_h, dst_w, dst_h):
+        assert dst_w <= src_w and dst_h <= src_h
+        self.rows = area_weights(src_h, dst_h)                      # (dst_h, src_h)
+        self.cols_t = np.ascontiguousarray(area_weights(src_w, dst_w).T)    # (src_w, dst_w)
+        self.src = np.empty((src_h, src_w * 3), dtype=np.float32)
+        self.tmp = np.empty((dst_h, src_w * 3), dtype=np.float32)
+        self.res = np.empty((dst_h, 3, dst_w), dtype=np.float32)
+        self.out = np.empty((dst_h, dst_w, 3), dtype=np.uint8)
+
+    def __call__(self, frame):
+        """
+        Return:
+            the downsampled frame (in a buffer reused by the next call)
+        """
+        np.copyto(self.src, frame.reshape(self.src.shape), casting="unsafe")
+        np.matmul(self.rows, self.src, out=self.tmp)
+        dst_h = self.tmp.shape[0]
+        np.matmul(self.tmp.reshape(dst_h, -1, 3).transpose(0, 2, 1), self.cols_t, out=self.res)
+        np.rint(self.res, out=self.res)
+        np.copyto(self.out, self.res.transpose(0, 2, 1), casting="unsafe")
+        return self.out
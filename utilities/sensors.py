@@ -0,0 +1,109 @@
+## Low-dimensional (ray-cast) sensor observations for CarRacing-obstacles, computed without rendering.
+
+import numpy as np
+from gym import spaces
+
+def get_car_pose(car):
+    """
+    Returns the (x, y) position and the body angle of the car.
+    The car drives along its local +y axis, i.e. its forward vector is (-sin(angle), cos(angle)).
+    """
+    return np.array([car.hull.position[0], car.hull.position[1]]), car.hull.angle
+
+def cast_rays(origin, directions, seg_start, seg_end, max_range):
+    """
+    Returns the distance along each ray to the first segment it hits (max_range if it hits none within max_range).
+
+    Args:
+        origin (np.ndarray): (2,) origin of all rays
+        directions (np.ndarray): (R, 2) unit direction of each ray
+        seg_start, seg_end (np.ndarray): (M, 2) segment end points
+
+    Return:
+        (R,) array of distances
+    """
+    if len(seg_start) == 0:
+        return np.full(len(directions), max_range)
+    edge = seg_end - seg_start                      # (M, 2)
+    to_start = seg_start - origin                   # (M, 2)
+    d = directions[:, None, :]                      # (R, 1, 2)
+    # Solve origin + s * direction = seg_start + u * edge, with 2D cross products
+    denom = d[..., 0] * edge[:, 1] - d[..., 1] * edge[:, 0]                             # (R, M)
+    s_num = to_start[:, 0] * edge[:, 1] - to_start[:, 1] * edge[:, 0]                   # (M,)
+    u_num = to_start[None, :, 0] * d[..., 1] - to_start[None, :, 1] * d[..., 0]         # (R, M)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = s_num[None, :] / denom
+        u = u_num / denom
+    hit = (denom != 0) & (s >= 0) & (u >= 0) & (u <= 1)
+    distances = np.where(hit, s, np.inf).min(axis=1)
+    return np.minimum(distances, max_range)
+
+class RaySensor:
+    """
+    Computes a vector observation from the car pose and the track geometry:
+    - num_rays distances to the road edge, cast in a fan of field_of_view radians around the car heading
+    - num_rays distances to the obstacle tiles along the same rays
+    - car speed, the four wheel angular velocities, the steering angle and the hull angular velocity
+      (the quantities shown by CarRacingObstacles.render_indicators())
+    - the next num_waypoints track points (every waypoint_stride tiles) in the car frame, as (x, y) pairs
+      where +y points forward and +x to the right of the car
+
+    Distances are in world units, capped at max_range.
+    """
+    def __init__(self, num_rays=9, field_of_view=np.pi, max_range=50.0, num_waypoints=5, waypoint_stride=3):
+        self.num_rays = num_rays
+        self.max_range = max_range
+        self.num_waypoints = num_waypoints
+        self.waypoint_stride = waypoint_stride
+        # Ray angles relative to the heading (positive = counter-clockwise, i.e. to the left)
+        self.ray_angles = np.linspace(-field_of_view / 2, field_of_view / 2, num_rays) if num_rays > 1 else np.zeros(1)
+        self.size = 2 * num_rays + 7 + 2 * num_waypoints
+        self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(self.size,), dtype=np.float32)
+
+    def set_track(self, track, track_width, obstacle_polygons):
+        """
+        Precomputes the segments the rays are cast against (called once per reset()).
+
+        Args:
+            track (np.ndarray): (N, 4) array of (alpha, beta, x, y) track points
+            track_width (float): half width of the road
+            obstacle_polygons (np.ndarray): (K, 4, 2) vertices of the obstacle tiles
+        """
+        beta, x, y = track[:, 1], track[:, 2], track[:, 3]
+        left = np.stack([x - track_width * np.cos(beta), y - track_width * np.sin(beta)], axis=1)
+        right = np.stack([x + track_width * np.cos(beta), y + track_width * np.sin(beta)], axis=1)
+        # The road edges are the closed polylines through the left and right tile corners
+        self.edge_start = np.concatenate([np.roll(left, 1, axis=0), np.roll(right, 1, axis=0)])
+        self.edge_end = np.concatenate([left, right])
+        obstacle_polygons = np.asarray(obstacle_polygons, dtype=np.float64).reshape(-1, 4, 2)
+        self.obstacle_start = obstacle_polygons.reshape(-1, 2)
+        self.obstacle_end = np.roll(obstacle_polygons, -1, axis=1).reshape(-1, 2)
+        self.waypoints = track[:, 2:4].copy()
+
+    def observe(self, car):
+        """
+        Return:
+            (size,) float32 observation
+        """
+        position, angle = get_car_pose(car)
+        ray_world_angles = angle + self.ray_angles
+        directions = np.stack([-np.sin(ray_world_angles), np.cos(ray_world_angles)], axis=1)
+        road_distances = cast_rays(position, directions, self.edge_start, self.edge_end, self.max_range)
+        obstacle_distances = cast_rays(position, directions, self.obstacle_start, self.obstacle_end, self.max_range)
+
+        velocity = car.hull.linearVelocity
+        dynamics = [
+            np.sqrt(np.square(velocity[0]) + np.square(velocity[1])),
+            car.wheels[0].omega, car.wheels[1].omega, car.wheels[2].omega, car.wheels[3].omega,
+            car.wheels[0].joint.angle,
+            car.hull.angularVelocity,
+        ]
+
+        # Next waypoints after the nearest track point, in the car frame
+        nearest = np.argmin(np.sum(np.square(self.waypoints - position), axis=1))
+        idx = (nearest + self.waypoint_stride * np.arange(1, self.num_waypoints + 1)) % len(self.waypoints)
+        relative = self.waypoints[idx] - position
+        c, s = np.cos(angle), np.sin(angle)
+        local = np.stack([relative[:, 0] * c + relative[:, 1] * s, -relative[:, 0] * s + relative[:, 1] * c], axis=1)
+
+        return np.concatenate([road_distances, obstacle_distances, dynamics, local.ravel()]).astype(np.float32)
@@ -0,0 +1,182 @@
+## Buffered, columnar telemetry of CarRacing-obstacles episodes (and optionally steps), written in the background.
+
+import glob
+import os
+import queue
+import threading
+
+import numpy as np
+
+# Columns of the per-episode records
+EPISODE_DTYPE = np.dtype([
+    ("episode", np.int64),
+    ("seed", np.uint64),     # (unseeded environments get 64-bit unsigned seeds)
+    ("turn_rate", np.float64),
+    ("obstacle_prob", np.float64),
+    ("num_tiles", np.int64),
+    ("num_obstacles", np.int64),
+    ("num_collisions", np.int64),
+    ("tiles_visited", np.int64),
+    ("reward", np.float64),
+    ("steps", np.int64),
+    ("grass_steps", np.int64),
+    ("time", np.float64),
+])
+
+# Columns of the per-step records
+STEP_DTYPE = np.dtype([
+    ("episode", np.int64),
+    ("step", np.int64),
+    ("reward", np.float64),
+    ("total_reward", np.float64),
+    ("background", np.int8),
+    ("num_collisions", np.int64),
+    ("nearest_obs_dist", np.float64),
+])
+
+class _RingBuffer:
+    """
+    Fixed-capacity buffer of structured records: once full, every new record overwrites the oldest one
+    (unless the buffer is emptied with take() first, e.g. to hand it over to a writer).
+    """
+    def __init__(self, dtype, capacity):
+        self.records = np.zeros(capacity, dtype=dtype)
+        self.size = 0
+        self.next = 0   # index of the next write
+
+    def append(self, values):
+        """Appends a record, and returns whether the buffer is full."""
+        self.records[self.next] = values
+        self.next = (self.next + 1) % len(self.records)
+        self.size = min(self.size + 1, len(self.records))
+        return self.size == len(self.records)
+
+    def ordered(self):
+        """Returns (a copy of) the buffered records, oldest first."""
+        start = (self.next - self.size) % len(self.records)
+        return np.roll(self.records, -start)[:self.size]
+
+    def take(self):
+        """Returns (a copy of) the buffered records, oldest first, and empties the buffer."""
+        records = self.ordered()
+        self.size = 0
+        self.next = 0
+        return records
+
+class TelemetrySink:
+    """
+    Collects structured per-episode (and, with step_records, per-step) records from CarRacingObstacles into
+    in-memory ring buffers. Full buffers are flushed in bulk by a background thread, as columnar .npz files
+    (one array per column) in directory: episodes-<pid>-<n>.npz and steps-<pid>-<n>.npz, so several processes
+    can share a directory. Use load() to read them back.
+
+    If the writer falls more than max_pending buffers behind, buffers are dropped (and counted in
+    self.dropped) rather than blocking the environment.
+    """
+    def __init__(self, directory=None, capacity=1024, step_records=False, max_pending=8):
+        """
+        Args:
+            directory (str): output directory (None keeps only the latest capacity records of each kind, in
+                memory: see buffered())
+            capacity (int): records per buffer (= per flushed file)
+            step_records (bool): also record every step()
+            max_pending (int): maximum number of buffers waiting to be written
+        """
+        self.directory = directory
+        self.step_records = step_records
+        self.buffers = {"episodes": _RingBuffer(EPISODE_DTYPE, capacity)}
+        if step_records:
+            self.buffers["steps"] = _RingBuffer(STEP_DTYPE, capacity)
+        self.file_counts = {kind: 0 for kind in self.buffers}
+        self.dropped = 0
+        self.queue = None
+        self.thread = None
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.queue = queue.Queue(maxsize=max_pending)
+            self.thread = threading.Thread(target=self._write_loop, name="TelemetrySinkWriter", daemon=True)
+            self.thread.start()
+
+    def record_episode(self, values):
+        """
+        Records one episode, as a tuple of values in EPISODE_DTYPE column order.
+        """
+        self._append("episodes", values)
+
+    def record_step(self, values):
+        """
+        Records one step, as a tuple of values in STEP_DTYPE column order (ignored without step_records).
+        """
+        if self.step_records:
+            self._append("steps", values)
+
+    def _append(self, kind, values):
+        # (without output, a full buffer keeps wrapping around, overwriting its oldest records)
+        if self.buffers[kind].append(values) and self.queue is not None:
+            self._flush(kind)
+
+    def _flush(self, kind):
+        buffer = self.buffers[kind]
+        if buffer.size == 0 or self.queue is None:
+            return
+        records = buffer.take()
+        try:
+            self.queue.put_nowait((kind, self.file_counts[kind], records))
+            self.file_counts[kind] += 1
+        except queue.Full:
+            self.dropped += len(records)
+
+    def _write_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            kind, index, records = item
+            path = os.path.join(self.directory, f"{kind}-{os.getpid()}-{index:06d}.npz")
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **{name: records[name] for name in records.dtype.names})
+            os.replace(tmp_path, path)
+
+    def buffered(self, kind="episodes"):
+        """
+        Returns (a copy of) the records buffered in memory, not flushed yet (oldest first; without a
+        directory, the latest capacity records).
+        """
+        return self.buffers[kind].ordered()
+
+    def flush(self):
+        """
+        Hands over all buffered records to the writer (if there is a directory).
+        """
+        for kind in self.buffers:
+            self._flush(kind)
+
+    def close(self):
+        """
+        Flushes the buffered records and waits for the writer to finish.
+        """
+        self.flush()
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            self.queue = None
+
+    @staticmethod
+    def load(directory, kind="episodes"):
+        """
+        Reads back all the records of one kind ("episodes" or "steps") written to directory.
+
+        Return:
+            dict of column arrays
+        """
+        paths = sorted(glob.glob(os.path.join(directory, f"{kind}-*.npz")))
+        dtype = EPISODE_DTYPE if kind == "episodes" else STEP_DTYPE
+        columns = {name: [] for name in dtype.names}
+        for path in paths:
+            with np.load(path) as f:
+                for name in dtype.names:
+                    columns[name].append(f[name])
+        return {name: np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtype[name])
+                for name, arrays in columns.items()}
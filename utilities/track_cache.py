@@ -0,0 +1,120 @@
+## Persistent (on-disk + in-memory LRU) cache of generated CarRacing-obstacles tracks.
+
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+# Arrays of a track geometry (see CarRacingObstacles._create_tile_geometry())
+GEOMETRY_KEYS = ["track", "poly_vertices", "poly_colors", "poly_friction", "poly_is_tile", "obstacle_centroids"]
+
+def rng_state_to_arrays(prefix, rng):
+    """
+    Converts the state of a np.random.RandomState (MT19937) into a dict of arrays.
+
+    Args:
+        prefix (str): prefix of the returned keys
+        rng (np.random.RandomState): random number generator (or the np.random module)
+
+    Return:
+        dict of arrays
+    """
+    _, keys, pos, has_gauss, cached_gaussian = rng.get_state()
+    return {
+        prefix + "_keys": np.asarray(keys, dtype=np.uint32),
+        prefix + "_pos": np.array(pos, dtype=np.int64),
+        prefix + "_has_gauss": np.array(has_gauss, dtype=np.int64),
+        prefix + "_gauss": np.array(cached_gaussian, dtype=np.float64),
+    }
+
+def set_rng_state_from_arrays(prefix, arrays, rng):
+    """
+    Restores the state of a np.random.RandomState saved with rng_state_to_arrays().
+    """
+    rng.set_state((
+        "MT19937",
+        np.asarray(arrays[prefix + "_keys"], dtype=np.uint32),
+        int(arrays[prefix + "_pos"]),
+        int(arrays[prefix + "_has_gauss"]),
+        float(arrays[prefix + "_gauss"]),
+    ))
+
+class TrackCache:
+    """
+    Caches the output of track generation, keyed by the random number generator states at the start of
+    reset() (which are determined by the seed) and by the track parameters (TRACK_TURN_RATE, OBSTACLE_PROB).
+
+    Each entry stores the track geometry arrays, plus the generator states *after* generation (including
+    all failed attempts), so that a cache hit leaves the environment exactly as if it had generated the track.
+
+    Entries are kept in a size-bounded in-memory LRU layer, and (optionally) in one uncompressed .npz file
+    per entry in a directory which can be shared between processes and runs.
+    """
+    def __init__(self, directory=None, max_entries=256):
+        """
+        Args:
+            directory (str): directory of the on-disk cache (None for a memory-only cache)
+            max_entries (int): maximum number of entries kept in memory
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(turn_rate, obstacle_prob, *rngs):
+        """
+        Returns the cache key of a track.
+
+        Args:
+            turn_rate (float): TRACK_TURN_RATE
+            obstacle_prob (float): OBSTACLE_PROB
+            rngs: the random number generators used for track generation, at the start of reset()
+        """
+        h = hashlib.sha1(f"{float(turn_rate)!r},{float(obstacle_prob)!r}".encode())
+        for rng in rngs:
+            for value in rng_state_to_arrays("", rng).values():
+                h.update(value.tobytes())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key):
+        """
+        Returns the cached entry (dict of arrays) for key, or None on a miss.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        elif self.directory is not None and os.path.exists(self._path(key)):
+            with np.load(self._path(key)) as f:
+                entry = {k: f[k] for k in f.files}
+            self._remember(key, entry)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """
+        Stores an entry (dict of arrays) in memory and, if the cache has a directory, on disk.
+        """
+        self._remember(key, entry)
+        if self.directory is not None and not os.path.exists(self._path(key)):
+            # Write to a temporary file first, so that concurrent readers never see a partial file
+            tmp_path = self._path(key) + f".{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **entry)
+            os.replace(tmp_path, self._path(key))
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
@@ -30,99 +30,162 @@ def check_if_car_on_grass(car):
     else:
         return False
 
-def check_if_car_on_obstacle(car):
+def check_if_car_on_obstacle(car, tile_is_obstacle=None):
     """
     Checks to see if car is on an obstacle, which is the case if at least one of the car's wheels
     is in contact with an obstacle tile.
 
     Args:
         car (car_racing.Car)
+        tile_is_obstacle (np.ndarray): obstacle flags indexed by tile id (CarRacingObstacles.tile_is_obstacle).
+            If not given, obstacles are recognized by their friction.
 
     Return:
         true if car is on an obstacle, false otherwise
     """
     for w in car.wheels:
         for tile in w.tiles:
-            if tile.road_friction > 2.0:    # (indicates that a tile is obstacle: see FrictionDetector in car_racing_obstacles.py)
+            if tile_is_obstacle is not None:
+                if tile_is_obstacle[tile.userData]:
+                    return True
+            elif tile.road_friction > 2.0:    # (indicates that a tile is obstacle: see FrictionDetector in car_racing_obstacles.py)
                 return True
     return False
 
+class ObstacleIndex:
+    """
+    Index of the obstacle centroids of a track, built once per reset().
+
+    The centroids are frozen into a (K, 2) array and queries are vectorized over all of them (and over
+    batches of query positions). Obstacles are at least OBSTACLE_SPACING tiles apart, so a track has at most
+    a few dozen of them, and a linear scan is cheaper than maintaining a KD-tree or a grid.
+    """
+    def __init__(self, obstacle_centroids):
+        """
+        Args:
+            obstacle_centroids (array-like): (K, 2) coordinates of the centroids of the obstacle tiles
+        """
+        self.centroids = np.asarray(obstacle_centroids, dtype=np.float64).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.centroids)
+
+    def _relative_positions(self, positions):
+        """Returns the (M, K, 2) vectors from each of the (M, 2) positions to each obstacle."""
+        return self.centroids[None, :, :] - np.asarray(positions, dtype=np.float64).reshape(-1, 1, 2)
+
+    def _squeeze(self, values, positions):
+        # Single (2,) query positions return scalars/(k,) arrays instead of batches
+        return values[0] if np.ndim(positions) == 1 else values
+
+    def nearest_distance(self, positions):
+        """
+        Returns the distance from each position to its nearest obstacle (np.inf if there are no obstacles).
+
+        Args:
+            positions (array-like): (2,) position or (M, 2) positions
+        """
+        distances = np.linalg.norm(self._relative_positions(positions), axis=2)
+        if len(self) == 0:
+            nearest = np.full(len(distances), np.inf)
+        else:
+            nearest = distances.min(axis=1)
+        return self._squeeze(nearest, positions)
+
+    def k_nearest(self, positions, k):
+        """
+        Returns the distances to, and indices of, the k nearest obstacles of each position (sorted by distance).
+        If there are fewer than k obstacles, the missing entries have distance np.inf and index -1.
+
+        Args:
+            positions (array-like): (2,) position or (M, 2) positions
+            k (int): number of obstacles
+
+        Return:
+            (distances, indices), both of shape (k,) or (M, k)
+        """
+        distances = np.linalg.norm(self._relative_positions(positions), axis=2)
+        order = np.argsort(distances, axis=1)[:, :k]
+        nearest = np.take_along_axis(distances, order, axis=1)
+        missing = k - order.shape[1]
+        if missing > 0:
+            nearest = np.pad(nearest, ((0, 0), (0, missing)), constant_values=np.inf)
+            order = np.pad(order, ((0, 0), (0, missing)), constant_values=-1)
+        return self._squeeze(nearest, positions), self._squeeze(order, positions)
+
+    def nearest_ahead_distance(self, positions, headings):
+        """
+        Returns the distance to the nearest obstacle in front of each car (np.inf if there is none).
+
+        Args:
+            positions (array-like): (2,) position or (M, 2) positions
+            headings (array-like): body angle(s) of the car(s). The car drives along its local +y axis, so its
+                forward vector is (-sin(angle), cos(angle)).
+        """
+        relative_positions = self._relative_positions(positions)
+        headings = np.asarray(headings, dtype=np.float64).reshape(-1, 1)
+        forward = np.stack([-np.sin(headings), np.cos(headings)], axis=2)  # (M, 1, 2)
+        in_front = np.sum(relative_positions * forward, axis=2) > 0
+        distances = np.where(in_front, np.linalg.norm(relative_positions, axis=2), np.inf)
+        if len(self) == 0:
+            nearest = np.full(len(distances), np.inf)
+        else:
+            nearest = distances.min(axis=1)
+        return self._squeeze(nearest, positions)
+
+def get_car_position(car):
+    """
+    Returns the (x, y) position of the car as a (2,) array.
+    """
+    return np.array([car.hull.position[0], car.hull.position[1]])
+
 def get_nearest_obstacle_distance(car, obstacle_centroids):
     """
-    Returns the distance to the nearest obstacle from the car's position.
+    Returns the distance to the nearest obstacle from the car's position (np.inf if there are no obstacles).
     Args:
         car (car_racing.Car)
-        obstacle_centroids (list): list of (x, y) coordinates of the centroids of the obstacle tiles
+        obstacle_centroids (ObstacleIndex or list): index or list of (x, y) coordinates of the centroids of the obstacle tiles
 
     Return:
         distance to the nearest obstacle from the car's position
     """
-    # Compute relative vector from car to obstacle centroids
-    car_x, car_y = car.hull.position
-    car_position = np.array([car_x, car_y])
-    obstacle_centroids_arr = np.array(obstacle_centroids)
-    relative_positions = obstacle_centroids_arr - car_position
-    # Compute distances to obstacles
-    distances = np.linalg.norm(relative_positions, axis=1)
-    return np.min(distances)
-
-    ## FUTURE CODE (to filter whether obstacle is in front of the car - doesn't seem to work properly at the moment)
-    # Get heading of the car
-    # car_heading = car.hull.angle
-    # car_heading_vector = np.array([np.cos(car_heading), np.sin(car_heading)])
-    # # Only keep obstacles that are in front of the car
-    # dot_products = np.dot(relative_positions, car_heading_vector)
-    # in_front_mask = dot_products > 0
-    # if np.all(~in_front_mask):
-    #     # No obstacles in front of the car
-    #     return np.inf
-    # else:
-    #     # Compute distances to obstacles that are in front of the car
-    #     distances = np.linalg.norm(relative_positions, axis=1)
-    #     distances = distances[in_front_mask]
-    #     return np.min(distances)
-
-def evaluate_best_model(best_model, eval_env, num_episodes=500):
+    if not isinstance(obstacle_centroids, ObstacleIndex):
+        obstacle_centroids = ObstacleIndex(obstacle_centroids)
+    return obstacle_centroids.nearest_distance(get_car_position(car))
+
+def get_nearest_obstacle_ahead_distance(car, obstacle_centroids):
     """
-    Evaluates a policy on an evaluation CarRacing environment.
-    (based on code from: Prishita Ray)
+    Returns the distance to the nearest obstacle in front of the car (np.inf if there is none).
+    Args:
+        car (car_racing.Car)
+        obstacle_centroids (ObstacleIndex or list): index or list of (x, y) coordinates of the centroids of the obstacle tiles
 
-    Prints the following metrics:
-    - Episode scores (for every episode)
-    - Average number of tiles covered (averaged over all episodes)
-    - Average time taken (averaged over all episodes)
-    - Average proportion of time spent on grass (averaged over all episodes)
+    Return:
+        distance to the nearest obstacle in front of the car
+    """
+    if not isinstance(obstacle_centroids, ObstacleIndex):
+        obstacle_centroids = ObstacleIndex(obstacle_centroids)
+    return obstacle_centroids.nearest_ahead_distance(get_car_position(car), car.hull.angle)
+
+def evaluate_best_model(best_model, eval_env, num_episodes=500, seed=0):
+    """
+    Evaluates a policy on an evaluation CarRacing environment, in this process.
+    (based on code from: Prishita Ray)
+    See utilities.evaluation.evaluate_parallel() to spread the episodes over several processes
+    (with the same per-episode seeds, hence the same results).
 
     Args:
         best_model (stable_baselines3.PPO): best policy
-        eval_env (car_racing.CarRacing): evaluation environment
+        eval_env (car_racing.CarRacing): evaluation environment (closed at the end)
+        num_episodes (int): number of episodes
+        seed (int): seed of the episode seeds
+
+    Return:
+        utilities.evaluation.EvaluationResults, with the episode scores, number of tiles covered,
+        time taken and proportion of time spent on grass
     """
-    # To calculate number of tiles covered and time taken in default environment
-    frames = []
-    tiles=0
-    times=0
-    total_road_or_obstacle_timesteps = 0
-    total_grass_timesteps = 0
-    for episode in range(1, num_episodes+1):
-        obs = eval_env.reset()  #state = env.reset()
-        done = False
-        score = 0
-        info={}
-        while not done:
-            # Check if car is on the grass
-            if check_if_car_on_grass(eval_env.car):
-                total_grass_timesteps += 1
-            else:
-                total_road_or_obstacle_timesteps += 1
-            # frames.append(env.render(mode='rgb_array'))
-            action , _ = best_model.predict(obs.copy())
-            obs, reward, done, info = eval_env.step(action)
-            score += reward
-        tiles+=eval_env.tile_visited_count
-        times+=eval_env.t
-        print("Episode:{} Score:{}".format(episode,score))
-    print("Number of tiles:",tiles/num_episodes)
-    print("Time taken:",times/num_episodes)
-    print("Proportion of time spent on grass:", \
-          total_grass_timesteps/(total_grass_timesteps+total_road_or_obstacle_timesteps))
+    from utilities.evaluation import EvaluationResults, episode_seeds, run_episode
+    seeds = episode_seeds(seed, num_episodes)
+    episodes = [run_episode(best_model, eval_env, episode_seed) for episode_seed in seeds]
     eval_env.close()
+    return EvaluationResults(seeds, episodes)
@@ -0,0 +1,304 @@
+## Subprocess vector environment for CarRacing-obstacles, with shared-memory observations/rewards/info.
+
+import multiprocessing as mp
+import traceback
+
+import numpy as np
+from gym import spaces
+from gym.vector.utils import CloudpickleWrapper
+
+# Info fields which can be written to shared memory (and their dtypes); the ones among the environments'
+# info_keys are allocated and returned by step_wait()
+INFO_KEYS = {
+    "num_obstacles": np.int64,
+    "num_collisions": np.int64,
+    "background": np.int64,
+    "wheels_on_grass": np.int64,
+    "tile_visited_count": np.int64,
+    "nearest_obs_dist": np.float64,
+    "nearest_obs_ahead_dist": np.float64,
+}
+
+def _allocate(ctx, num_envs, shape, dtype):
+    """Returns a (raw shared buffer, shape, dtype) spec of a (num_envs, *shape) array."""
+    shape = (num_envs,) + tuple(shape)
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return ctx.RawArray("B", max(nbytes, 1)), shape, np.dtype(dtype)
+
+def _check_box(space, name):
+    """Shared observation arrays are allocated per Box space: nested Dict/Tuple spaces are not supported."""
+    if not isinstance(space, spaces.Box):
+        raise ValueError(f"SharedMemoryVecEnv: observation space {name} must be a Box (nested {type(space).__name__} "
+                         f"spaces are not supported)")
+
+def _as_arrays(shared):
+    """Returns NumPy views of the shared buffers created by _allocate()."""
+    return {
+        name: np.frombuffer(raw, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+        for name, (raw, shape, dtype) in shared.items()
+    }
+
+def _write(target, value):
+    # (None observations come from obs_type="none" environments: nothing to write;
+    # frames rendered directly into the shared slot are already in place)
+    if value is None:
+        return
+    if isinstance(value, np.ndarray) and value.ctypes.data == target.ctypes.data:
+        return
+    target[...] = value
+
+def _write_observation(arrays, index, obs):
+    if isinstance(obs, dict):
+        for key, value in obs.items():
+            _write(arrays["obs/" + key][index], value)
+    elif isinstance(obs, tuple):
+        for i, value in enumerate(obs):
+            _write(arrays[f"obs/{i}"][index], value)
+    else:
+        _write(arrays["obs"][index], obs)
+
+def _observation_slot(env, arrays, index):
+    """
+    Returns the shared image slot of this worker if the environment can render into it directly
+    (see CarRacingObstacles.set_observation_buffer()), None otherwise.
+    """
+    base = env.unwrapped
+    slot = arrays.get("obs", arrays.get("obs/image"))
+    if getattr(base, "resolutions", None) is not None:
+        # Multi-resolution observations: the full-size frame (if it is one of them) is the render buffer
+        full_size = (base.STATE_W, base.STATE_H)
+        slot = arrays.get(f"obs/{base.resolutions.index(full_size)}") if full_size in base.resolutions else None
+    if slot is None or not hasattr(base, "set_observation_buffer"):
+        return None
+    slot = slot[index]
+    if slot.dtype != np.uint8 or slot.shape != (base.STATE_H, base.STATE_W, 3):
+        return None
+    return slot
+
+def _write_info(arrays, index, info):
+    for name, array in arrays.items():
+        if name.startswith("info/"):
+            array[index] = info[name[len("info/"):]]
+
+def _reset_info(env):
+    """Info of the first observation of an episode (reset() does not return one)."""
+    return env.unwrapped.get_info()
+
+def _worker(index, env_fn, pipe, parent_pipe, shared):
+    parent_pipe.close()
+    arrays = _as_arrays(shared)
+    env = None
+    # Observation of an automatic reset which has not been returned yet
+    pending_reset = None
+    try:
+        env = env_fn.x()
+        slot = _observation_slot(env, arrays, index)
+        if slot is not None:
+            env.unwrapped.set_observation_buffer(slot)
+            # Automatic resets render into a private buffer: the parent may still be reading the slot
+            reset_buffer = np.empty_like(slot)
+        while True:
+            command, data = pipe.recv()
+            if command == "step":
+                if pending_reset is not None:
+                    # The episode finished on the previous step: return the first observation of the next one
+                    if slot is not None:
+                        env.unwrapped.set_observation_buffer(slot)
+                    _write_observation(arrays, index, pending_reset)
+                    _write_info(arrays, index, _reset_info(env))
+                    arrays["reward"][index] = 0.0
+                    arrays["done"][index] = False
+                    pending_reset = None
+                    pipe.send((None, True))
+                    continue
+                obs, reward, done, info = env.step(arrays["action"][index])
+                _write_observation(arrays, index, obs)
+                _write_info(arrays, index, info)
+                arrays["reward"][index] = reward
+                arrays["done"][index] = done
+                pipe.send((None, True))
+                if done:
+                    # Reset while the parent (and the other workers) carry on
+                    if slot is not None:
+                        env.unwrapped.set_observation_buffer(reset_buffer)
+                    pending_reset = env.reset()
+            elif command == "reset":
+                if slot is not None:
+                    env.unwrapped.set_observation_buffer(slot)
+                pending_reset = None
+                _write_observation(arrays, index, env.reset())
+                _write_info(arrays, index, _reset_info(env))
+                arrays["reward"][index] = 0.0
+                arrays["done"][index] = False
+                pipe.send((None, True))
+            elif command == "seed":
+                pipe.send((env.seed(data), True))
+            elif command == "getattr":
+                pipe.send((getattr(env.unwrapped, data), True))
+            elif command == "close":
+                pipe.send((None, True))
+                break
+            else:
+                raise RuntimeError(f"Unknown command: {command}")
+    except (KeyboardInterrupt, EOFError):
+        pass
+    except Exception:
+        pipe.send((traceback.format_exc(), False))
+    finally:
+        if env is not None:
+            env.close()
+
+class SharedMemoryVecEnv:
+    """
+    Runs several CarRacingObstacles (or CarRacingObstaclesPsiKP / CarRacingObstaclesPsiKPEval) environments
+    in subprocesses.
+
+    Observations, actions, rewards, dones and the info fields (the environments' info_keys which are in
+    INFO_KEYS) are exchanged through preallocated shared-memory NumPy arrays (one array per key of a Dict
+    observation space, e.g. 'image' and 'psi', or per element of a Tuple observation space, e.g.
+    multi-resolution frames), so only short command messages go through the pipes.
+
+    Episodes are reset automatically and in a pipelined way: when an environment is done, step() returns its
+    final observation with done=True, and the worker immediately starts the reset() in the background. The
+    next step() for that environment ignores its action and returns the first observation of the new
+    episode (with reward 0 and done=False).
+    """
+    def __init__(self, env_fns, context=None, copy=True):
+        """
+        Args:
+            env_fns (list): functions creating each environment
+            context (str): multiprocessing start method (default: the platform default)
+            copy (bool): return copies of the shared arrays (otherwise, the returned arrays are views which
+                are overwritten by the next step())
+        """
+        ctx = mp.get_context(context)
+        self.num_envs = len(env_fns)
+        self.copy = copy
+
+        dummy_env = env_fns[0]()
+        self.observation_space = dummy_env.observation_space
+        self.action_space = dummy_env.action_space
+        self.info_keys = [key for key in dummy_env.unwrapped.info_keys if key in INFO_KEYS]
+        dummy_env.close()
+
+        shared = {}
+        if isinstance(self.observation_space, spaces.Dict):
+            for key, space in self.observation_space.spaces.items():
+                _check_box(space, repr(key))
+                shared["obs/" + key] = _allocate(ctx, self.num_envs, space.shape, space.dtype)
+        elif isinstance(self.observation_space, spaces.Tuple):
+            for i, space in enumerate(self.observation_space.spaces):
+                _check_box(space, str(i))
+                shared[f"obs/{i}"] = _allocate(ctx, self.num_envs, space.shape, space.dtype)
+        else:
+            space = self.observation_space
+            shared["obs"] = _allocate(ctx, self.num_envs, space.shape, space.dtype)
+        shared["action"] = _allocate(ctx, self.num_envs, self.action_space.shape, self.action_space.dtype)
+        shared["reward"] = _allocate(ctx, self.num_envs, (), np.float64)
+        shared["done"] = _allocate(ctx, self.num_envs, (), np.bool_)
+        for key in self.info_keys:
+            shared["info/" + key] = _allocate(ctx, self.num_envs, (), INFO_KEYS[key])
+        self._arrays = _as_arrays(shared)
+
+        self.pipes = []
+        self.processes = []
+        for index, env_fn in enumerate(env_fns):
+            parent_pipe, child_pipe = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                name=f"SharedMemoryVecEnvWorker-{index}",
+                args=(index, CloudpickleWrapper(env_fn), child_pipe, parent_pipe, shared),
+                daemon=True,
+            )
+            self.pipes.append(parent_pipe)
+            self.processes.append(process)
+            process.start()
+            child_pipe.close()
+        self.waiting = False
+        self.closed = False
+
+    def _receive(self):
+        results = []
+        for pipe in self.pipes:
+            result, success = pipe.recv()
+            if not success:
+                raise RuntimeError(f"Error in SharedMemoryVecEnv worker:\n{result}")
+            results.append(result)
+        return results
+
+    def _get(self, name):
+        return self._arrays[name].copy() if self.copy else self._arrays[name]
+
+    def _observations(self):
+        if isinstance(self.observation_space, spaces.Dict):
+            return {key: self._get("obs/" + key) for key in self.observation_space.spaces}
+        if isinstance(self.observation_space, spaces.Tuple):
+            return tuple(self._get(f"obs/{i}") for i in range(len(self.observation_space.spaces)))
+        return self._get("obs")
+
+    def reset(self):
+        """
+        Resets all environments and returns the batched observations (the shared rewards and dones are zeroed,
+        and the info arrays hold the info of the first observations).
+        """
+        for pipe in self.pipes:
+            pipe.send(("reset", None))
+        self._receive()
+        return self._observations()
+
+    def step_async(self, actions):
+        self._arrays["action"][:] = actions
+        for pipe in self.pipes:
+            pipe.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        """
+        Return:
+            observations, rewards (num_envs,), dones (num_envs,), and info (dict of (num_envs,) arrays)
+        """
+        self._receive()
+        self.waiting = False
+        infos = {key: self._get("info/" + key) for key in self.info_keys}
+        return self._observations(), self._get("reward"), self._get("done"), infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def seed(self, seeds):
+        """
+        Seeds every environment.
+
+        Args:
+            seeds (list): one seed per environment
+        """
+        for pipe, seed in zip(self.pipes, seeds):
+            pipe.send(("seed", seed))
+        return self._receive()
+
+    def get_attr(self, name):
+        """
+        Returns the value of an attribute of every (unwrapped) environment.
+        """
+        for pipe in self.pipes:
+            pipe.send(("getattr", name))
+        return self._receive()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            self._receive()
+        for pipe in self.pipes:
+            pipe.send(("close", None))
+        self._receive()
+        for process in self.processes:
+            process.join()
+        for pipe in self.pipes:
+            pipe.close()
+        self.closed = True
+
+    def __del__(self):
+        if not getattr(self, "closed", True):
+            self.close()
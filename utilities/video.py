@@ -0,0 +1,229 @@
+## Asynchronous frame/video recording of CarRacing-obstacles episodes (frames are dropped rather than stalling the env).
+
+import collections
+import logging
+import os
+import queue
+import threading
+
+import gym
+import numpy as np
+
+try:
+    import imageio
+except ImportError:
+    imageio = None
+
+logger = logging.getLogger(__name__)
+
+class RawFrameWriter:
+    """
+    Writes frames into a preallocated memory-mapped .npy file of (capacity, H, W, 3) uint8 frames (frames beyond
+    capacity are rejected: write() returns False), plus an <path>.index.npz file with the number of frames and
+    their step indices. Use load_raw_frames() to read them back.
+    """
+    def __init__(self, path, frame_shape, capacity=1000):
+        self.path = path
+        self.frames = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(capacity,) + tuple(frame_shape))
+        self.steps = np.zeros(capacity, dtype=np.int64)
+        self.num_frames = 0
+
+    def write(self, frame, step):
+        if self.num_frames == len(self.frames):
+            return False
+        self.frames[self.num_frames] = frame
+        self.steps[self.num_frames] = step
+        self.num_frames += 1
+        return True
+
+    def close(self):
+        self.frames.flush()
+        np.savez(self.path + ".index.npz", num_frames=self.num_frames, steps=self.steps[:self.num_frames])
+        self.frames = None
+
+def load_raw_frames(path):
+    """
+    Return:
+        (frames, steps) of a file written by RawFrameWriter (frames is a read-only memory map)
+    """
+    with np.load(path + ".index.npz") as f:
+        num_frames, steps = int(f["num_frames"]), f["steps"]
+    return np.load(path, mmap_mode="r")[:num_frames], steps
+
+class VideoFileWriter:
+    """
+    Encodes frames into a video file with imageio (optional dependency, with its ffmpeg plugin).
+    """
+    def __init__(self, path, fps=50):
+        if imageio is None:
+            raise ImportError("VideoFileWriter requires imageio (pip install imageio imageio-ffmpeg)")
+        self.writer = imageio.get_writer(path, fps=fps)
+
+    def write(self, frame, step):
+        self.writer.append_data(frame)
+        return True
+
+    def close(self):
+        self.writer.close()
+
+class AsyncFrameRecorder(gym.Wrapper):
+    """
+    Records frames of selected episodes of a CarRacingObstacles environment (or of its psi subclasses) without
+    blocking it: frames are put into a bounded queue, and a background thread writes them (one writer, i.e.
+    one file, per recorded clip). When the queue is full, frames are dropped (and counted in self.dropped,
+    along with the frames beyond the capacity of a raw file).
+
+    Recording is triggered by
+    - episode_trigger(episode index) (e.g. lambda episode: episode % 100 == 0): the whole episode is recorded
+      (into episode-<n>.npy or episode-<n>.<video_format>)
+    - collision_frames > 0: the next collision_frames steps are recorded whenever num_collisions increases
+      (into episode-<n>-step-<k>.npy, sized for collision_frames frames, or episode-<n>-step-<k>.<video_format>)
+    """
+    def __init__(self, env, directory, mode="rgb_array", episode_trigger=None, collision_frames=0,
+                 video_format="raw", max_queue=64, raw_capacity=1000):
+        """
+        Args:
+            env (gym.Env): environment to record
+            directory (str): output directory
+            mode (str): render mode of the frames ("rgb_array" or "state_pixels")
+            episode_trigger (callable): episode index -> whether to record the whole episode
+            collision_frames (int): number of steps recorded after every new collision (0 to disable)
+            video_format (str): "raw" for memory-mapped frame dumps (RawFrameWriter), or a video file
+                extension such as "mp4" (VideoFileWriter)
+            max_queue (int): maximum number of frames waiting to be written
+            raw_capacity (int): maximum number of frames of a whole episode in raw format
+        """
+        super().__init__(env)
+        self.directory = directory
+        self.mode = mode
+        self.episode_trigger = episode_trigger
+        self.collision_frames = collision_frames
+        self.video_format = video_format
+        self.raw_capacity = raw_capacity
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.episode = -1
+        self.step_count = 0
+        self.record_episode = False
+        self.event_frames_left = 0
+        self.last_collisions = 0
+        # Clip being recorded: (name, raw capacity), and the number of its frames put into the queue
+        self.clip = None
+        self.clip_frames = 0
+        self.queue_dropped = 0
+        self.overflow_dropped = 0     # (updated by the writer thread)
+        self.recorded = 0
+        self.queue = queue.Queue(maxsize=max_queue)
+        # Control messages which did not fit into the queue (sent before the next frame)
+        self.pending_control = collections.deque()
+        self.thread = threading.Thread(target=self._write_loop, name="AsyncFrameRecorder", daemon=True)
+        self.thread.start()
+
+    @property
+    def dropped(self):
+        """Number of frames not recorded (queue full, or beyond the capacity of a raw file)."""
+        return self.queue_dropped + self.overflow_dropped
+
+    def _make_writer(self, name, capacity, frame_shape):
+        if self.video_format == "raw":
+            return RawFrameWriter(os.path.join(self.directory, name + ".npy"), frame_shape, capacity)
+        fps = self.env.metadata.get("video.frames_per_second", 50)
+        return VideoFileWriter(os.path.join(self.directory, f"{name}.{self.video_format}"), fps)
+
+    def _write_loop(self):
+        writers = {}
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            kind, (name, capacity), step, frame = item
+            try:
+                if kind == "frame":
+                    if name not in writers:
+                        writers[name] = self._make_writer(name, capacity, frame.shape)
+                    if not writers[name].write(frame, step):
+                        self.overflow_dropped += 1
+                elif name in writers:  # "end" of a clip
+                    writers.pop(name).close()
+            except Exception:
+                # Keep draining the queue (the environment must never block on it)
+                logger.exception("Failed to write frames of %s", name)
+        for writer in writers.values():
+            writer.close()
+
+    def _flush_control(self):
+        """Sends the pending control messages which fit into the queue (in order)."""
+        while self.pending_control:
+            try:
+                self.queue.put_nowait(self.pending_control[0])
+            except queue.Full:
+                return
+            self.pending_control.popleft()
+
+    def _start_clip(self, name, capacity):
+        self._end_clip()
+        self.clip = (name, capacity)
+        self.clip_frames = 0
+
+    def _end_clip(self):
+        """Ends the current clip, if any: its writer is closed (only needed if it got frames)."""
+        if self.clip is not None and self.clip_frames > 0:
+            # Never blocks: without room in the queue, the message waits in pending_control
+            self.pending_control.append(("end", self.clip, self.step_count, None))
+            self._flush_control()
+        self.clip = None
+
+    def _capture(self):
+        self._flush_control()
+        if self.mode == "state_pixels":
+            # The observation (rendered at most once per step) can be in a reused buffer
+            frame = self.env.unwrapped.get_observation().copy()
+        else:
+            frame = self.env.render(self.mode)
+        try:
+            self.queue.put_nowait(("frame", self.clip, self.step_count, frame))
+            self.recorded += 1
+            self.clip_frames += 1
+        except queue.Full:
+            self.queue_dropped += 1
+
+    def reset(self, **kwargs):
+        self._end_clip()
+        self.episode += 1
+        self.step_count = 0
+        self.record_episode = self.episode_trigger is not None and bool(self.episode_trigger(self.episode))
+        self.event_frames_left = 0
+        obs = self.env.reset(**kwargs)
+        self.last_collisions = self.env.unwrapped.num_collisions
+        if self.record_episode:
+            self._start_clip(f"episode-{self.episode:06d}", self.raw_capacity)
+            self._capture()
+        return obs
+
+    def step(self, action):
+        obs, reward, done, info = self.env.step(action)
+        self.step_count += 1
+        num_collisions = self.env.unwrapped.num_collisions
+        if self.collision_frames > 0 and num_collisions > self.last_collisions:
+            self.event_frames_left = self.collision_frames
+            if not self.record_episode:
+                # (a collision during a clip starts a new clip)
+                self._start_clip(f"episode-{self.episode:06d}-step-{self.step_count:06d}", self.collision_frames)
+        self.last_collisions = num_collisions
+        if self.record_episode or self.event_frames_left > 0:
+            self.event_frames_left = max(self.event_frames_left - 1, 0)
+            self._capture()
+            if not self.record_episode and self.event_frames_left == 0:
+                self._end_clip()
+        return obs, reward, done, info
+
+    def close(self):
+        if self.thread is not None:
+            self._end_clip()
+            # Closing may wait for the writer
+            while self.pending_control:
+                self.queue.put(self.pending_control.popleft())
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        return self.env.close()